@@ -1,9 +1,14 @@
 """Games, or Adversarial Search (Chapter 5)"""
 
-from collections import namedtuple
+from array import array
+from collections import defaultdict, namedtuple
+import json
+import math
+import multiprocessing
 import random
+import time
 
-from utils import argmax
+from utils import argmax, map_jobs
 from canvas import Canvas
 
 infinity = float('inf')
@@ -83,20 +88,40 @@ def alphabeta_full_search(state, game):
     return best_action
 
 
-def alphabeta_search(state, game, d=4, cutoff_test=None, eval_fn=None):
+def alphabeta_search(state, game, d=4, cutoff_test=None, eval_fn=None,
+                     batch_eval_fn=None):
     """Search game to determine best action; use alpha-beta pruning.
-    This version cuts off search and uses an evaluation function."""
+    This version cuts off search and uses an evaluation function.
+    If batch_eval_fn is given, a node whose children are all cut off has
+    them evaluated together, by one call of batch_eval_fn(states) that
+    returns a list of their values; that suits evaluators with a large cost
+    per call, such as ones that work on whole arrays. Every child of such a
+    node is evaluated (there is no pruning at the last ply), but the number
+    of evaluator calls drops by about the branching factor."""
 
     player = game.to_move(state)
 
+    def successors(state, depth):
+        """The states after each move from state and, if batch_eval_fn is
+        given and they are all cut off at depth + 1, their values from one
+        call of batch_eval_fn (else None)."""
+        if batch_eval_fn is None:
+            return (game.result(state, a) for a in game.actions(state)), None
+        children = [game.result(state, a) for a in game.actions(state)]
+        if children and all(cutoff_test(c, depth + 1) for c in children):
+            return children, batch_eval_fn(children)
+        return children, None
+
     # Functions used by alphabeta
     def max_value(state, alpha, beta, depth):
         if cutoff_test(state, depth):
             return eval_fn(state)
+        children, values = successors(state, depth)
+        if values is not None:
+            return max(values)
         v = -infinity
-        for a in game.actions(state):
-            v = max(v, min_value(game.result(state, a),
-                                 alpha, beta, depth + 1))
+        for child in children:
+            v = max(v, min_value(child, alpha, beta, depth + 1))
             if v >= beta:
                 return v
             alpha = max(alpha, v)
@@ -105,10 +130,12 @@ def alphabeta_search(state, game, d=4, cutoff_test=None, eval_fn=None):
     def min_value(state, alpha, beta, depth):
         if cutoff_test(state, depth):
             return eval_fn(state)
+        children, values = successors(state, depth)
+        if values is not None:
+            return min(values)
         v = infinity
-        for a in game.actions(state):
-            v = min(v, max_value(game.result(state, a),
-                                 alpha, beta, depth + 1))
+        for child in children:
+            v = min(v, max_value(child, alpha, beta, depth + 1))
             if v <= alpha:
                 return v
             beta = min(beta, v)
@@ -130,6 +157,319 @@ def alphabeta_search(state, game, d=4, cutoff_test=None, eval_fn=None):
             best_action = a
     return best_action
 
+# ______________________________________________________________________________
+# An alpha-beta engine: transposition table, iterative deepening, move ordering
+
+
+class SearchTimeout(Exception):
+    "Raised inside AlphaBetaEngine when the time budget runs out."
+
+
+class AlphaBetaEngine:
+
+    """Iterative-deepening alpha-beta search with a transposition table, to
+    depth plies or for time_limit seconds, using eval_fn(state, player) at
+    the depth limit. An engine is also a player: play_game(game,
+    AlphaBetaEngine(game, time_limit=1), random_player)."""
+
+    EXACT, LOWER, UPPER = 0, 1, 2
+    SOLVED = float('inf')  # depth of an entry searched to the end of the game
+
+    def __init__(self, game, depth=None, time_limit=None, eval_fn=None,
+                 table_size=2 ** 20):
+        # Table entries are keyed by game.state_key(state); a slot is
+        # overwritten by a search at least as deep or by any search of a
+        # later move (a later generation)
+        self.game = game
+        self.max_depth = depth
+        self.time_limit = time_limit
+        self.eval_fn = eval_fn or (lambda state, player: 0)
+        self.table = [None] * table_size
+        self.history = {}
+        self.generation = 0
+        self.nodes = self.depth = 0
+        self.value = None  # nodes, depth, value and elapsed describe the last search
+        self.elapsed = 0
+
+    def __call__(self, game, state):
+        return self.search(state)
+
+    def search(self, state, depth=None, time_limit=None):
+        """Return the best move of the deepest iteration completed within the
+        depth and time limits (by default those given to the constructor)."""
+        depth = depth or self.max_depth
+        time_limit = time_limit or self.time_limit
+        start = time.perf_counter()
+        self.deadline = None if time_limit is None else start + time_limit
+        self.generation += 1
+        self.killers = {}
+        self.nodes = self.depth = 0
+        self.value = None
+        best_move = None
+        d = 1
+        while depth is None or d <= depth:
+            try:
+                value, move, solved = self.search_root(state, d)
+            except SearchTimeout:
+                break
+            self.depth, self.value, best_move = d, value, move
+            if solved:
+                break
+            d += 1
+        self.elapsed = time.perf_counter() - start
+        if best_move is None:  # Not even depth 1 finished in time
+            best_move = self.game.actions(state)[0]
+        return best_move
+
+    def search_root(self, state, depth):
+        """Search state to depth; return its value, the best move and whether
+        the value is exact (not cut off by depth)."""
+        horizon = self.horizon = 0
+        value, move = self.negamax(state, depth, -infinity, infinity, 0)
+        return value, move, self.horizon == horizon
+
+    def negamax(self, state, depth, alpha, beta, ply):
+        """Return the value of state to the player to move, searched to
+        depth, and the best move found (None at a leaf)."""
+        game = self.game
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % 1024 == 0:
+            if time.perf_counter() > self.deadline:
+                raise SearchTimeout
+        key = game.state_key(state)
+        # Mix the key (Fibonacci hashing) so that keys differing only in
+        # their high bits, like the packed bitboard keys, spread over the table
+        slot = ((hash(key) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF) >> 32) % len(self.table)
+        entry = self.table[slot]
+        table_move = None
+        if entry is not None and entry[0] == key:
+            _, entry_depth, value, flag, table_move, _ = entry
+            if entry_depth >= depth and ply > 0:
+                if entry_depth != self.SOLVED:
+                    self.horizon += 1
+                if (flag == self.EXACT or
+                        (flag == self.LOWER and value >= beta) or
+                        (flag == self.UPPER and value <= alpha)):
+                    return value, table_move
+        player = game.to_move(state)
+        if game.terminal_test(state):
+            value = game.utility(state, player)
+            self.store(slot, key, self.SOLVED, value, self.EXACT, None)
+            return value, None
+        if depth == 0:
+            self.horizon += 1
+            return self.eval_fn(state, player), None
+        alpha0, horizon = alpha, self.horizon
+        best, best_move = -infinity, None
+        for move in self.ordered_moves(state, table_move, ply):
+            value = -self.negamax(game.result(state, move), depth - 1,
+                                  -beta, -alpha, ply + 1)[0]
+            if value > best:
+                best, best_move = value, move
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    killers = self.killers.setdefault(ply, [])
+                    if move not in killers:
+                        killers.insert(0, move)
+                        del killers[2:]
+                    self.history[move] = self.history.get(move, 0) + depth * depth
+                    break
+        flag = (self.UPPER if best <= alpha0 else
+                self.LOWER if best >= beta else self.EXACT)
+        if self.horizon == horizon:
+            depth = self.SOLVED
+        self.store(slot, key, depth, best, flag, best_move)
+        return best, best_move
+
+    def ordered_moves(self, state, table_move, ply):
+        """The legal moves in state, most promising first: the table's move,
+        then the killer moves of this ply, then by history score."""
+        history = self.history
+        moves = sorted(self.game.actions(state),
+                       key=lambda move: -history.get(move, 0))
+        for move in reversed(self.killers.get(ply, [])):
+            if move in moves:
+                moves.remove(move)
+                moves.insert(0, move)
+        if table_move is not None and table_move in moves:
+            moves.remove(table_move)
+            moves.insert(0, table_move)
+        return moves
+
+    def store(self, slot, key, depth, value, flag, move):
+        "Put an entry in the table, unless the slot holds a deeper one from this search."
+        entry = self.table[slot]
+        if (entry is None or entry[5] != self.generation or entry[0] == key or
+                depth >= entry[1]):
+            self.table[slot] = (key, depth, value, flag, move, self.generation)
+
+# ______________________________________________________________________________
+# Monte Carlo tree search
+
+
+def random_rollout(game, state):
+    "Play random moves from state to the end of the game; return the final state."
+    while not game.terminal_test(state):
+        state = game.result(state, random.choice(game.actions(state)))
+    return state
+
+
+class MCTSNode:
+    """A node in a Monte Carlo search tree: a state, the move that led to it
+    and the player who made that move, its children, the moves not yet
+    expanded, and the number of playouts through it with the total utility
+    they gave the player who moved."""
+
+    __slots__ = ('state', 'parent', 'move', 'player', 'children', 'untried',
+                 'visits', 'value')
+
+    def __init__(self, state, parent=None, move=None, player=None, untried=()):
+        self.state = state
+        self.parent = parent
+        self.move = move
+        self.player = player
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.value = 0
+
+    def ucb(self, c):
+        "The UCB1 score of this node as a choice for its parent's player."
+        return (self.value / self.visits +
+                c * math.sqrt(math.log(self.parent.visits) / self.visits))
+
+
+class MCTSPlayer:
+
+    """A player that chooses moves by Monte Carlo tree search (UCT), running
+    simulations playouts or for time_limit seconds and playing the most
+    visited move; with processes other than 1, searches in that many worker
+    processes until close() or the end of a with block."""
+
+    def __init__(self, simulations=None, time_limit=None, c=math.sqrt(2),
+                 rollout=random_rollout, processes=1, seed=None):
+        if simulations is None and time_limit is None:
+            simulations = 1000
+        # c is the UCB1 exploration constant; it suits utilities between
+        # about -1 and 1, as in TicTacToe
+        self.simulations = simulations
+        self.time_limit = time_limit
+        self.c = c
+        self.rollout = rollout
+        self.processes = processes
+        self.seed = seed
+        self.pool = None  # Kept from move to move until close()
+        self.game = self.root = None  # The tree is kept for the next move
+        self.moves = 0
+        # The throughput of the last move's search
+        self.playouts = self.elapsed = self.playouts_per_second = 0
+
+    def __call__(self, game, state):
+        start = time.perf_counter()
+        self.moves += 1
+        if self.processes == 1:
+            root = self.reuse(game, state)
+            self.playouts = self.search(game, root)
+            counts = {child.move: child.visits for child in root.children}
+        else:
+            counts, self.playouts = self.parallel_search(game, state)
+        move = max(counts, key=counts.get)
+        if self.processes == 1:
+            self.game = game
+            self.root = next(child for child in root.children if child.move == move)
+        self.elapsed = time.perf_counter() - start
+        self.playouts_per_second = self.playouts / self.elapsed
+        return move
+
+    def new_node(self, game, state, parent=None, move=None):
+        untried = [] if game.terminal_test(state) else list(game.actions(state))
+        random.shuffle(untried)
+        player = None if parent is None else game.to_move(parent.state)
+        return MCTSNode(state, parent, move, player, untried)
+
+    def reuse(self, game, state):
+        """The node for state in the tree kept from the last move, if it is
+        there (as the position after our move or after a reply to it), else
+        a new root."""
+        if game is self.game and self.root is not None:
+            nodes = [self.root] + self.root.children
+            for node in nodes:
+                if node.state == state:
+                    node.parent = None
+                    return node
+        return self.new_node(game, state)
+
+    def search(self, game, root, simulations=None, time_limit=None):
+        """Run playouts from root, always at least one so that there is a move
+        to choose; return how many were run."""
+        simulations = simulations or self.simulations
+        time_limit = time_limit or self.time_limit
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        c = self.c
+        n = 0
+        while n == 0 or ((simulations is None or n < simulations) and
+                         (deadline is None or time.perf_counter() < deadline)):
+            # Walk down by UCB1, add one node, play out with rollout(game,
+            # state) and back up the final utility
+            node = root
+            while not node.untried and node.children:
+                node = max(node.children, key=lambda child: child.ucb(c))
+            if node.untried:
+                move = node.untried.pop()
+                child = self.new_node(game, game.result(node.state, move), node, move)
+                node.children.append(child)
+                node = child
+            final = self.rollout(game, node.state)
+            while node is not None:
+                node.visits += 1
+                if node.player is not None:
+                    node.value += game.utility(final, node.player)
+                node = node.parent
+            n += 1
+        return n
+
+    def parallel_search(self, game, state):
+        """Search state in independent trees, one per worker process (root
+        parallelization), seeded from self.seed if given; return the summed
+        root visit counts and the total number of playouts. The game and
+        rollout must be picklable."""
+        workers = self.processes or multiprocessing.cpu_count()
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(workers)
+        simulations = self.simulations and -(-self.simulations // workers)
+        seed = None if self.seed is None else self.seed + self.moves * workers
+        jobs = [(game, state, simulations, self.time_limit, self.c,
+                 self.rollout, None if seed is None else seed + i)
+                for i in range(workers)]
+        counts, playouts = {}, 0
+        for (worker_counts, n) in self.pool.starmap(mcts_root_counts, jobs):
+            for (move, visits) in worker_counts.items():
+                counts[move] = counts.get(move, 0) + visits
+            playouts += n
+        return counts, playouts
+
+    def close(self):
+        "Shut down the worker processes, if any."
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def mcts_root_counts(game, state, simulations, time_limit, c, rollout, seed):
+    "One worker's search for MCTSPlayer.parallel_search."
+    if seed is not None:
+        random.seed(seed)
+    player = MCTSPlayer(simulations, time_limit, c, rollout)
+    root = player.new_node(game, state)
+    n = player.search(game, root)
+    return {child.move: child.visits for child in root.children}, n
+
 # ______________________________________________________________________________
 # Players for Games
 
@@ -165,6 +505,110 @@ def play_game(game, *players):
                 game.display(state)
                 return game.utility(state, game.to_move(game.initial))
 
+
+def play_match(game, players, seed=None):
+    """Play one game between players, in order, without displaying it, with
+    random.seed(seed) first if a seed is given. Return a dict with the
+    utility of the final state to the first player, the number of moves and
+    the seconds each move took."""
+    if seed is not None:
+        random.seed(seed)
+    state = game.initial
+    move_times = []
+    while not game.terminal_test(state):
+        player = players[len(move_times) % len(players)]
+        start = time.perf_counter()
+        move = player(game, state)
+        move_times.append(time.perf_counter() - start)
+        state = game.result(state, move)
+    return dict(utility=game.utility(state, game.to_move(game.initial)),
+                moves=len(move_times), move_times=move_times)
+
+
+def tournament(game, players, games=10, seed=0, processes=1, file=None):
+    """Play games games between every pair of players, a dict of {name:
+    player}, with the two taking turns at moving first. Game i is played
+    after random.seed(seed + i), so a tournament can be replayed. The games
+    run through map_jobs with processes. Each game's record, with the
+    players' names, the result for the first player and per-move times, is
+    written as a JSON line to file (if given) as soon as it is played.
+    Returns the list of records; see tournament_stats."""
+    names = list(players)
+    jobs = []
+    for (i, a) in enumerate(names):
+        for b in names[i + 1:]:
+            for g in range(games):
+                first, second = (a, b) if g % 2 == 0 else (b, a)
+                jobs.append((first, second, seed + len(jobs)))
+    args = [(game, (players[first], players[second]), s)
+            for (first, second, s) in jobs]
+    records = []
+    for ((first, second, s), result) in zip(jobs, map_jobs(play_match, args, processes)):
+        record = dict(first=first, second=second, seed=s, **result)
+        records.append(record)
+        if file is not None:
+            file.write(json.dumps(record) + '\n')
+            file.flush()
+    return records
+
+
+def tournament_stats(records, z=1.96):
+    """Summarize tournament records for each player: games, wins, draws,
+    losses, score (a win counts 1, a draw 1/2), the score's confidence
+    interval for the given z (1.96 for 95%), mean seconds per move, and an
+    Elo rating fitted to all the results (Bradley-Terry, with one virtual
+    draw per pair of players so that a perfect score stays finite), shifted
+    to average 0."""
+    stats = {}
+    score = defaultdict(float)  # (a, b): points a scored against b
+    played = defaultdict(int)  # (a, b): games between a and b
+    for r in records:
+        outcome = (r['utility'] > 0) - (r['utility'] < 0)
+        for (name, result, moves) in [(r['first'], outcome, r['move_times'][0::2]),
+                                      (r['second'], -outcome, r['move_times'][1::2])]:
+            s = stats.setdefault(name, dict(games=0, wins=0, draws=0, losses=0,
+                                            time=0.0, moves=0))
+            s['games'] += 1
+            s['wins' if result > 0 else 'losses' if result < 0 else 'draws'] += 1
+            s['time'] += sum(moves)
+            s['moves'] += len(moves)
+        pair = (r['first'], r['second'])
+        score[pair] += (outcome + 1) / 2
+        score[pair[::-1]] += (1 - outcome) / 2
+        played[pair] += 1
+        played[pair[::-1]] += 1
+    for s in stats.values():
+        n = s['games']
+        p = (s['wins'] + s['draws'] / 2) / n
+        margin = z * math.sqrt(p * (1 - p) / n)
+        s['score'] = p
+        s['interval'] = (max(0, p - margin), min(1, p + margin))
+        s['time_per_move'] = s.pop('time') / max(1, s.pop('moves'))
+    for (name, elo) in elo_ratings(list(stats), score, played).items():
+        stats[name]['elo'] = elo
+    return stats
+
+
+def elo_ratings(names, score, played, iterations=200):
+    """Fit Bradley-Terry strengths to the points score[a, b] that a scored in
+    played[a, b] games against b, by minorization-maximization, adding one
+    drawn game to every pair that met; return them as Elo ratings."""
+    pairs = [(a, b) for a in names for b in names if played[a, b]]
+    points = {a: 0.5 * sum(1 for (x, _) in pairs if x == a) for a in names}
+    games = {(a, b): played[a, b] + 1 for (a, b) in pairs}
+    for (a, b) in pairs:
+        points[a] += score[a, b]
+    strength = dict.fromkeys(names, 1.0)
+    for _ in range(iterations):
+        for a in names:
+            total = sum(games[x, b] / (strength[a] + strength[b])
+                        for (x, b) in pairs if x == a)
+            if total:
+                strength[a] = points[a] / total
+    ratings = {a: 400 * math.log10(strength[a]) for a in names}
+    mean = sum(ratings.values()) / len(ratings)
+    return {a: ratings[a] - mean for a in names}
+
 # ______________________________________________________________________________
 # Some Sample Games
 
@@ -202,6 +646,16 @@ class Game:
         "Print or otherwise display the state."
         print(state)
 
+    def state_key(self, state):
+        """Return an integer that identifies state, for transposition tables;
+        by default its hash, so states must be hashable."""
+        return hash(state)
+
+    def canonical_key(self, state):
+        """Return a key shared by state and the states symmetric to it; by
+        default state_key(state), that is, no symmetries are known."""
+        return self.state_key(state)
+
     def __repr__(self):
         return '<%s>' % self.__class__.__name__
 
@@ -241,6 +695,8 @@ class TicTacToe(Game):
     the form of a list of (x, y) positions, and a board, in the form of
     a dict of {(x, y): Player} entries, where Player is 'X' or 'O'."""
 
+    gravity = False  # Can a square be played only above an occupied one?
+
     def __init__(self, h=3, v=3, k=3):
         self.h = h
         self.v = v
@@ -248,6 +704,11 @@ class TicTacToe(Game):
         moves = [(x, y) for x in range(1, h + 1)
                  for y in range(1, v + 1)]
         self.initial = GameState(to_move='X', utility=0, board={}, moves=moves)
+        rng = random.Random(h * v * k)
+        self.zobrist = {(square, player): rng.getrandbits(64)
+                        for square in moves for player in 'XO'}
+        self.zobrist['O'] = rng.getrandbits(64)
+        self.symmetries = None
 
     def actions(self, state):
         "Legal moves are any square not yet taken."
@@ -272,6 +733,29 @@ class TicTacToe(Game):
         "A state is terminal if it is won or there are no empty squares."
         return state.utility != 0 or len(state.moves) == 0
 
+    def state_key(self, state):
+        "The Zobrist hash of the board and the player to move."
+        key = self.zobrist['O'] if state.to_move == 'O' else 0
+        zobrist = self.zobrist
+        for item in state.board.items():
+            key ^= zobrist[item]
+        return key
+
+    def canonical_key(self, state):
+        """The smallest state_key among the reflections and rotations of
+        state, so that symmetric positions share a key."""
+        if self.symmetries is None:
+            self.symmetries = board_symmetries(self.h, self.v, self.gravity)
+        base = self.zobrist['O'] if state.to_move == 'O' else 0
+        zobrist = self.zobrist
+        keys = []
+        for symmetry in self.symmetries:
+            key = base
+            for (square, player) in state.board.items():
+                key ^= zobrist[(symmetry[square], player)]
+            keys.append(key)
+        return min(keys)
+
     def display(self, state):
         board = state.board
         for x in range(1, self.h + 1):
@@ -310,6 +794,8 @@ class ConnectFour(TicTacToe):
     row, or in a square directly above an occupied square.  Traditionally
     played on a 7x6 board and requiring 4 in a row."""
 
+    gravity = True
+
     def __init__(self, h=7, v=6, k=4):
         TicTacToe.__init__(self, h, v, k)
 
@@ -318,6 +804,339 @@ class ConnectFour(TicTacToe):
                 if y == 1 or (x, y - 1) in state.board]
 
 
+BitboardState = namedtuple('BitboardState', 'to_move, utility, x, o')
+
+
+class BitboardTicTacToe(Game):
+    """TicTacToe with the same moves and utilities as TicTacToe, but with
+    each player's squares held as bits of an integer, so a state is a small
+    hashable tuple, a move is a couple of integer operations and a win is
+    found by shifting and and-ing the mover's bits. Square (x, y) is bit
+    (x - 1) * (v + 1) + (y - 1); the spare bit at the top of each column
+    stays empty so that lines cannot wrap from one column to the next."""
+
+    gravity = False
+
+    def __init__(self, h=3, v=3, k=3):
+        self.h = h
+        self.v = v
+        self.k = k
+        self.stride = stride = v + 1
+        self.squares = {}  # square bit: (x, y)
+        self.bits = {}  # (x, y): square bit
+        for x in range(1, h + 1):
+            for y in range(1, v + 1):
+                bit = 1 << ((x - 1) * stride + (y - 1))
+                self.squares[bit] = (x, y)
+                self.bits[(x, y)] = bit
+        self.full = sum(self.squares)
+        # k in a row is found by repeatedly and-ing the bits with themselves
+        # shifted along a line, doubling the run length covered each time
+        steps, run = [], 1
+        while run < k:
+            steps.append(min(run, k - run))
+            run += steps[-1]
+        self.line_shifts = [[step * shift for step in steps]
+                            for shift in (1, stride, stride - 1, stride + 1)]
+        self.initial = BitboardState(to_move='X', utility=0, x=0, o=0)
+        self.symmetries = None
+
+    def legal(self, state):
+        "The bits of the squares that can be played in state."
+        return self.full & ~(state.x | state.o)
+
+    def actions(self, state):
+        "Legal moves are any square not yet taken."
+        moves = []
+        legal = self.legal(state)
+        while legal:
+            bit = legal & -legal
+            moves.append(self.squares[bit])
+            legal ^= bit
+        return moves
+
+    def result(self, state, move):
+        bit = self.bits.get(move, 0)
+        if not bit & self.legal(state):
+            return state  # Illegal move has no effect
+        to_move, utility, x, o = state
+        if to_move == 'X':
+            x |= bit
+            return BitboardState('O', 1 if self.wins(x) else 0, x, o)
+        else:
+            o |= bit
+            return BitboardState('X', -1 if self.wins(o) else 0, x, o)
+
+    def wins(self, bits):
+        "Are there k squares in a line among bits?"
+        for shifts in self.line_shifts:
+            line = bits
+            for shift in shifts:
+                line &= line >> shift
+            if line:
+                return True
+        return False
+
+    def utility(self, state, player):
+        "Return the value to player; 1 for win, -1 for loss, 0 otherwise."
+        return state.utility if player == 'X' else -state.utility
+
+    def terminal_test(self, state):
+        "A state is terminal if it is won or there are no empty squares."
+        return state.utility != 0 or not self.full & ~(state.x | state.o)
+
+    def state_key(self, state):
+        "Both players' bits and the player to move, packed into one integer."
+        return (((state.o << self.full.bit_length()) | state.x) << 1 |
+                (state.to_move == 'O'))
+
+    def canonical_key(self, state):
+        """The smallest state_key among the reflections and rotations of
+        state, so that symmetric positions share a key."""
+        if self.symmetries is None:
+            self.symmetries = [[(bit, self.bits[symmetry[square]])
+                                for (bit, square) in self.squares.items()]
+                               for symmetry in board_symmetries(self.h, self.v, self.gravity)]
+        keys = []
+        for symmetry in self.symmetries:
+            x = o = 0
+            for (bit, image) in symmetry:
+                if state.x & bit:
+                    x |= image
+                elif state.o & bit:
+                    o |= image
+            keys.append(self.state_key(BitboardState(state.to_move, 0, x, o)))
+        return min(keys)
+
+    def display(self, state):
+        for x in range(1, self.h + 1):
+            for y in range(1, self.v + 1):
+                bit = self.bits[(x, y)]
+                print('X' if state.x & bit else 'O' if state.o & bit else '.',
+                      end=' ')
+            print()
+
+
+class BitboardConnectFour(BitboardTicTacToe):
+    """ConnectFour on bitboards: the playable square of each column is found
+    for all columns at once by adding a bit at the bottom of every column to
+    the occupied squares and letting the carry stop at the first gap."""
+
+    gravity = True
+
+    def __init__(self, h=7, v=6, k=4):
+        BitboardTicTacToe.__init__(self, h, v, k)
+        self.bottom = sum(self.bits[(x, 1)] for x in range(1, h + 1))
+
+    def legal(self, state):
+        return ((state.x | state.o) + self.bottom) & self.full
+
+
+KInARowState = namedtuple('KInARowState', 'to_move, utility, x, o, score')
+
+# The number of 1 bits in a non-negative integer
+popcount = getattr(int, 'bit_count', lambda n: bin(n).count('1'))
+
+
+class KInARow(BitboardTicTacToe):
+    """k in a row on an h x v board (by default 15 x 15 with k=5, as in
+    gomoku), on bitboards, with the result of each move worked out
+    incrementally from the windows of k squares in a line through it: a
+    window holding only the mover's stones gains one; one holding only the
+    opponent's is blocked. That is O(k) windows per move, with no board
+    scan and no copying. A state also carries score, the sum over windows
+    held by one player only of 4 ** (stones - 1), X's minus O's, which
+    evaluate turns into an evaluation function for AlphaBetaEngine. With
+    near=r, actions offers only the squares within r of a stone (the centre
+    on an empty board), which keeps the branching factor of a large board
+    manageable."""
+
+    def __init__(self, h=15, v=15, k=5, near=None):
+        super().__init__(h, v, k)
+        self.near = near
+        self.windows = {bit: [] for bit in self.squares}
+        for (x, y) in self.bits:
+            for (dx, dy) in [(1, 0), (0, 1), (1, 1), (1, -1)]:
+                line = [(x + i * dx, y + i * dy) for i in range(k)]
+                if all(square in self.bits for square in line):
+                    window = sum(self.bits[square] for square in line)
+                    for square in line:
+                        self.windows[self.bits[square]].append(window)
+        self.weights = [0] + [4 ** i for i in range(k)]
+        self.initial = KInARowState(to_move='X', utility=0, x=0, o=0, score=0)
+
+    def actions(self, state):
+        if self.near is None or self.terminal_test(state):
+            return super().actions(state)
+        occupied = state.x | state.o
+        if not occupied:
+            return [((self.h + 1) // 2, (self.v + 1) // 2)]
+        around = occupied
+        for _ in range(self.near):
+            ring = around
+            for shift in (1, self.stride - 1, self.stride, self.stride + 1):
+                ring |= (around << shift) | (around >> shift)
+            around = ring & self.full  # Drop bits that wrapped into a spare bit or off the board
+        legal = self.legal(state) & around
+        moves = []
+        while legal:
+            bit = legal & -legal
+            moves.append(self.squares[bit])
+            legal ^= bit
+        return moves
+
+    def result(self, state, move):
+        bit = self.bits.get(move, 0)
+        if not bit & self.legal(state):
+            return state  # Illegal move has no effect
+        to_move, utility, x, o, score = state
+        mine, theirs = (x, o) if to_move == 'X' else (o, x)
+        weights, k = self.weights, self.k
+        gain, won = 0, False
+        for window in self.windows[bit]:
+            if theirs & window:
+                if not mine & window:
+                    gain += weights[popcount(theirs & window)]
+            else:
+                n = popcount(mine & window) + 1
+                gain += weights[n] - weights[n - 1]
+                won = won or n == k
+        mine |= bit
+        if to_move == 'X':
+            return KInARowState('O', 1 if won else 0, mine, theirs, score + gain)
+        else:
+            return KInARowState('X', -1 if won else 0, theirs, mine, score - gain)
+
+    def window_score(self, x, o):
+        "The score of a board, from scratch; result keeps it up to date."
+        score = 0
+        for window in set(w for windows in self.windows.values() for w in windows):
+            if not o & window:
+                score += self.weights[popcount(x & window)]
+            elif not x & window:
+                score -= self.weights[popcount(o & window)]
+        return score
+
+    def evaluate(self, state, player):
+        """An estimate of the value of state to player, between -1 and 1, from
+        its score."""
+        value = state.score / (abs(state.score) + self.weights[-1])
+        return value if player == 'X' else -value
+
+
+class KInARowConnectFour(KInARow, BitboardConnectFour):
+    "KInARow with ConnectFour's rule that a move goes on the lowest free square of a column."
+
+    def __init__(self, h=7, v=6, k=4, near=None):
+        KInARow.__init__(self, h, v, k, near)
+
+
+def board_symmetries(h, v, gravity=False):
+    """The symmetries of an h x v board, as dicts mapping each (x, y) square
+    to its image: the reflections and rotations that keep the board in
+    place (all 8 when it is square), or with gravity, where moves build up
+    from row 1, only the identity and the left-right mirror."""
+    squares = [(x, y) for x in range(1, h + 1) for y in range(1, v + 1)]
+    maps = [lambda x, y: (x, y), lambda x, y: (h + 1 - x, y)]
+    if not gravity:
+        maps += [lambda x, y: (x, v + 1 - y),
+                 lambda x, y: (h + 1 - x, v + 1 - y)]
+        if h == v:
+            maps += [lambda x, y: (y, x), lambda x, y: (v + 1 - y, x),
+                     lambda x, y: (y, h + 1 - x),
+                     lambda x, y: (v + 1 - y, h + 1 - x)]
+    return [{(x, y): f(x, y) for (x, y) in squares} for f in maps]
+
+
+class SolvedGame:
+
+    """The game-theoretic value of every state reachable from state (by
+    default the game's initial state) of a small two-player, zero-sum game
+    such as TicTacToe or ConnectFour on a small board. Each state is solved
+    once, however many move orders reach it, and symmetric states share one
+    entry, keyed by game.canonical_key. values maps keys to the value of
+    the state to the player to move. A SolvedGame is a perfect player:
+    play_game(game, SolvedGame(game), random_player). Save the table with
+    save, and read it back with load_solved_game."""
+
+    def __init__(self, game, state=None):
+        self.game = game
+        self.values = {}
+        if state is None:
+            state = game.initial
+        self.solve(state)
+
+    def solve(self, state):
+        "Return the value of state to the player to move, solving it if needed."
+        game = self.game
+        key = game.canonical_key(state)
+        value = self.values.get(key)
+        if value is None:
+            if game.terminal_test(state):
+                value = game.utility(state, game.to_move(state))
+            else:
+                value = max(-self.solve(game.result(state, move))
+                            for move in game.actions(state))
+            self.values[key] = value
+        return value
+
+    def value(self, state):
+        "The value of a solved state to the player to move."
+        return self.values[self.game.canonical_key(state)]
+
+    def best_move(self, state):
+        "A move from state that keeps its game-theoretic value."
+        game = self.game
+        return max(game.actions(state),
+                   key=lambda move: -self.solve(game.result(state, move)))
+
+    def __call__(self, game, state):
+        return self.best_move(state)
+
+    def __len__(self):
+        return len(self.values)
+
+    def save(self, file):
+        """Write the table to a file opened in binary mode: the sorted keys
+        as fixed-width integers, then one signed byte per value (or
+        a double, if the utilities are not small integers)."""
+        keys = sorted(self.values)
+        width = max(key.bit_length() // 8 + 1 for key in keys) if keys else 1
+        if all(isinstance(v, int) and -128 <= v < 128 for v in self.values.values()):
+            typecode = 'b'
+        else:
+            typecode = 'd'
+        file.write(solved_game_magic)
+        file.write(array('q', [len(keys), width, ord(typecode)]).tobytes())
+        file.write(b''.join(key.to_bytes(width, 'little', signed=True)
+                            for key in keys))
+        file.write(array(typecode, [self.values[key] for key in keys]).tobytes())
+
+
+solved_game_magic = b'AIMAGT01'
+
+
+def load_solved_game(file, game):
+    """Read a table written by SolvedGame.save for game from a binary file.
+    The game's canonical_key must be the same as when the table was saved,
+    which rules out the default, hash-based keys of games whose states are
+    strings (their hashes change from run to run)."""
+    if file.read(8) != solved_game_magic:
+        raise ValueError('not a solved game table')
+    header = array('q')
+    header.frombytes(file.read(24))
+    n, width, typecode = header
+    blob = file.read(n * width)
+    values = array(chr(typecode))
+    values.frombytes(file.read(n * values.itemsize))
+    solved = SolvedGame.__new__(SolvedGame)
+    solved.game = game
+    solved.values = {int.from_bytes(blob[i * width:(i + 1) * width], 'little',
+                                    signed=True): value
+                     for (i, value) in enumerate(values)}
+    return solved
+
+
 class Canvas_TicTacToe(Canvas):
     """Play a 3x3 TicTacToe game on HTML canvas
     TODO: Add restart button
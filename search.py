@@ -5,17 +5,30 @@ then create problem instances and solve them with calls to the various search
 functions."""
 
 from utils import (
-    is_in, argmin, argmax, argmax_random_tie, probability,
-    weighted_sample_with_replacement, memoize, print_table, DataFile, Stack,
-    FIFOQueue, PriorityQueue, name
+    is_in, argmin, argmax, argmax_random_tie, probability, weighted_sampler,
+    memoize, print_table, DataFile, Stack, FIFOQueue, PriorityQueue, name,
+    num_or_str, vector_add, map_jobs
 )
-from grid import distance
+from grid import distance, orientations
 
-from collections import defaultdict
+from array import array
+from collections import defaultdict, deque
+import heapq
+import itertools
 import math
+import operator
+import pickle
 import random
 import sys
 import bisect
+import copy
+import csv
+import functools
+import json
+import mmap
+import multiprocessing
+import queue
+import time
 
 infinity = float('inf')
 
@@ -82,8 +95,13 @@ class Node:
     the same state.  Also includes the action that got us to this state, and
     the total path_cost (also known as g) to reach the node.  Other functions
     may add an f and h value; see best_first_graph_search and astar_search for
-    an explanation of how the f and h values are handled. You will not need to
-    subclass this class."""
+    an explanation of how the f and h values are handled. Searches can create
+    millions of nodes, so nodes have __slots__ (including f and h) rather than
+    a __dict__ each. A search that needs more fields per node can subclass
+    Node with more __slots__, as MemoryBoundedNode does: children are made
+    with the class of their parent."""
+
+    __slots__ = ('state', 'parent', 'action', 'path_cost', 'depth', 'f', 'h')
 
     def __init__(self, state, parent=None, action=None, path_cost=0):
         "Create a search tree Node, derived from a parent by an action."
@@ -109,13 +127,18 @@ class Node:
     def child_node(self, problem, action):
         "[Figure 3.10]"
         next = problem.result(self.state, action)
-        return Node(next, self, action,
+        return self.__class__(next, self, action,
                     problem.path_cost(self.path_cost, self.state,
                                       action, next))
 
     def solution(self):
         "Return the sequence of actions to go from the root to this node."
-        return [node.action for node in self.path()[1:]]
+        node, actions = self, []
+        while node.parent is not None:
+            actions.append(node.action)
+            node = node.parent
+        actions.reverse()
+        return actions
 
     def path(self):
         "Return a list of nodes forming the path from the root to this node."
@@ -123,7 +146,8 @@ class Node:
         while node:
             path_back.append(node)
             node = node.parent
-        return list(reversed(path_back))
+        path_back.reverse()
+        return path_back
 
     # We want for a queue of nodes in breadth_first_search or
     # astar_search to have no duplicated states, so we treat nodes
@@ -177,8 +201,10 @@ def tree_search(problem, frontier):
     """Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     Don't worry about repeated paths to a state. [Figure 3.7]"""
+    observe = observer(problem)
     frontier.append(Node(problem.initial))
     while frontier:
+        observe(len(frontier))
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
@@ -190,9 +216,11 @@ def graph_search(problem, frontier):
     """Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     If two paths reach a state, only use the first one. [Figure 3.7]"""
+    observe = observer(problem)
     frontier.append(Node(problem.initial))
     explored = set()
     while frontier:
+        observe(len(frontier), len(explored))
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
@@ -223,10 +251,12 @@ def breadth_first_search(problem):
     node = Node(problem.initial)
     if problem.goal_test(node.state):
         return node
+    observe = observer(problem)
     frontier = FIFOQueue()
     frontier.append(node)
     explored = set()
     while frontier:
+        observe(len(frontier), len(explored))
         node = frontier.pop()
         explored.add(node.state)
         for child in node.expand(problem):
@@ -237,6 +267,29 @@ def breadth_first_search(problem):
     return None
 
 
+def breadth_first_reached_search(problem):
+    """Breadth-first search that marks a state as reached when it is
+    generated, rather than keeping separate explored and frontier sets.
+    The frontier is a plain deque of nodes, so each child costs one set
+    lookup; this is the form used in the 4th edition."""
+    node = Node(problem.initial)
+    if problem.goal_test(node.state):
+        return node
+    observe = observer(problem)
+    frontier = deque([node])
+    reached = {node.state}
+    while frontier:
+        observe(len(frontier), len(reached))
+        node = frontier.popleft()
+        for child in node.expand(problem):
+            if child.state not in reached:
+                if problem.goal_test(child.state):
+                    return child
+                reached.add(child.state)
+                frontier.append(child)
+    return None
+
+
 def best_first_graph_search(problem, f):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
@@ -249,10 +302,12 @@ def best_first_graph_search(problem, f):
     node = Node(problem.initial)
     if problem.goal_test(node.state):
         return node
+    observe = observer(problem)
     frontier = PriorityQueue(min, f)
     frontier.append(node)
     explored = set()
     while frontier:
+        observe(len(frontier), len(explored))
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
@@ -273,31 +328,53 @@ def uniform_cost_search(problem):
     return best_first_graph_search(problem, lambda node: node.path_cost)
 
 
-def depth_limited_search(problem, limit=50):
-    "[Figure 3.17]"
-    def recursive_dls(node, problem, limit):
-        if problem.goal_test(node.state):
-            return node
-        elif limit == 0:
-            return 'cutoff'
-        else:
-            cutoff_occurred = False
-            for child in node.expand(problem):
-                result = recursive_dls(child, problem, limit - 1)
-                if result == 'cutoff':
-                    cutoff_occurred = True
-                elif result is not None:
-                    return result
-            return 'cutoff' if cutoff_occurred else None
+no_action = object()  # Marks an exhausted action iterator on a search stack
 
-    # Body of depth_limited_search:
-    return recursive_dls(Node(problem.initial), problem, limit)
+
+def depth_limited_search(problem, limit=50, avoid_cycles=False):
+    """[Figure 3.17] with an explicit stack in place of recursion, so the
+    limit is not bounded by Python's recursion limit. The stack holds each
+    node on the current path with an iterator over its untried actions, so
+    memory stays linear in the depth. Returns a goal node, 'cutoff' if some
+    node was cut off by the limit, or None. If avoid_cycles is true, children
+    whose state is already on the current path are skipped (this needs
+    hashable states)."""
+    node = Node(problem.initial)
+    if problem.goal_test(node.state):
+        return node
+    elif limit == 0:
+        return 'cutoff'
+    cutoff_occurred = False
+    observe = observer(problem)
+    stack = [(node, iter(problem.actions(node.state)))]
+    path_states = {node.state} if avoid_cycles else None
+    while stack:
+        observe(len(stack))
+        node, actions = stack[-1]
+        action = next(actions, no_action)
+        if action is no_action:
+            stack.pop()
+            if avoid_cycles:
+                path_states.discard(node.state)
+            continue
+        child = node.child_node(problem, action)
+        if avoid_cycles and child.state in path_states:
+            continue
+        if problem.goal_test(child.state):
+            return child
+        elif child.depth == limit:
+            cutoff_occurred = True
+        else:
+            stack.append((child, iter(problem.actions(child.state))))
+            if avoid_cycles:
+                path_states.add(child.state)
+    return 'cutoff' if cutoff_occurred else None
 
 
-def iterative_deepening_search(problem):
+def iterative_deepening_search(problem, avoid_cycles=False):
     "[Figure 3.18]"
     for depth in range(sys.maxsize):
-        result = depth_limited_search(problem, depth)
+        result = depth_limited_search(problem, depth, avoid_cycles)
         if result != 'cutoff':
             return result
 
@@ -315,6 +392,219 @@ def astar_search(problem, h=None):
     h = memoize(h or problem.h, 'h')
     return best_first_graph_search(problem, lambda n: n.path_cost + h(n))
 
+
+def iterative_deepening_astar_search(problem, h=None, avoid_cycles=True):
+    """IDA*: repeated depth-first searches, each cut off at nodes whose
+    f = g + h exceeds a bound; the next bound is the smallest f that was cut
+    off. Uses memory linear in the solution depth and, like
+    depth_limited_search, an explicit stack rather than recursion. With
+    avoid_cycles (the default) states already on the current path are not
+    revisited."""
+    h = h or problem.h
+    observe = observer(problem)
+    root = Node(problem.initial)
+    bound = h(root)
+    while bound < infinity:
+        if problem.goal_test(root.state):
+            return root
+        next_bound = infinity
+        stack = [(root, iter(problem.actions(root.state)))]
+        path_states = {root.state} if avoid_cycles else None
+        while stack:
+            observe(len(stack))
+            node, actions = stack[-1]
+            action = next(actions, no_action)
+            if action is no_action:
+                stack.pop()
+                if avoid_cycles:
+                    path_states.discard(node.state)
+                continue
+            child = node.child_node(problem, action)
+            if avoid_cycles and child.state in path_states:
+                continue
+            f = child.path_cost + h(child)
+            if f > bound:
+                next_bound = min(next_bound, f)
+            elif problem.goal_test(child.state):
+                return child
+            else:
+                stack.append((child, iter(problem.actions(child.state))))
+                if avoid_cycles:
+                    path_states.add(child.state)
+        bound = next_bound
+    return None
+
+# ______________________________________________________________________________
+# Bounded and anytime search
+
+
+def beam_search(problem, width=10, f=None):
+    """Breadth-first search that keeps only the width best nodes (lowest f)
+    of each level; f defaults to g + h, with the problem's h. Memory and
+    time per level are bounded by width times the branching factor, at the
+    price of completeness and optimality."""
+    if f is None:
+        h = problem.h
+        f = lambda n: n.path_cost + h(n)
+    node = Node(problem.initial)
+    if problem.goal_test(node.state):
+        return node
+    observe = observer(problem)
+    beam = [node]
+    reached = {node.state: node.path_cost}
+    while beam:
+        observe(len(beam), len(reached))
+        children = []
+        for node in beam:
+            for child in node.expand(problem):
+                if child.path_cost < reached.get(child.state, infinity):
+                    if problem.goal_test(child.state):
+                        return child
+                    reached[child.state] = child.path_cost
+                    children.append(child)
+        beam = heapq.nsmallest(width, children, key=f)
+    return None
+
+
+def anytime_repairing_astar(problem, h=None, epsilon=3, step=0.5,
+                            deadline=None):
+    """Anytime Repairing A* (ARA*; Likhachev, Gordon and Thrun). A generator
+    that yields a first solution found by weighted A* with f = g + epsilon*h,
+    which costs at most epsilon times the optimum, and then better ones as
+    epsilon is lowered by step towards 1. Each round reuses the previous
+    search: only the states whose cost improved are re-expanded. Stops when
+    epsilon reaches 1 or at time.perf_counter() deadline, if given."""
+    h = memoize(h or problem.h, 'h')
+    node = Node(problem.initial)
+    solution = node if problem.goal_test(node.state) else None
+    best = {node.state: node}  # The cheapest node found for each state
+    fringe = {node.state: node}
+    inconsistent = {}
+    counter = itertools.count()
+    observe = observer(problem)
+    while True:
+        heap = [(n.path_cost + epsilon * h(n), next(counter), n)
+                for n in fringe.values()]
+        heapq.heapify(heap)
+        closed = set()
+        while heap and (solution is None or solution.path_cost > heap[0][0]):
+            if deadline is not None and time.perf_counter() > deadline:
+                return
+            observe(len(fringe), len(closed))
+            _, _, node = heapq.heappop(heap)
+            if fringe.get(node.state) is not node:
+                continue
+            del fringe[node.state]
+            closed.add(node.state)
+            for child in node.expand(problem):
+                if child.state in best and best[child.state].path_cost <= child.path_cost:
+                    continue
+                best[child.state] = child
+                if problem.goal_test(child.state):
+                    if solution is None or child.path_cost < solution.path_cost:
+                        solution = child
+                elif child.state in closed:
+                    inconsistent[child.state] = child
+                else:
+                    fringe[child.state] = child
+                    heapq.heappush(heap, (child.path_cost + epsilon * h(child),
+                                          next(counter), child))
+        if solution is not None:
+            yield solution
+        if epsilon <= 1:
+            return
+        epsilon = max(1, epsilon - step)
+        fringe.update(inconsistent)
+        inconsistent = {}
+
+
+def anytime_astar_search(problem, h=None, epsilon=3, step=0.5, time_limit=None):
+    """Run anytime_repairing_astar for at most time_limit seconds and return
+    the best solution found by then (None if there is none yet). With no
+    time limit this returns an optimal solution."""
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    solution = None
+    for solution in anytime_repairing_astar(problem, h, epsilon, step, deadline):
+        pass
+    return solution
+
+# ______________________________________________________________________________
+# Bidirectional Search
+
+
+def bidirectional_best_first_search(problem, inverse, f, f_inverse, bound=max):
+    """Search forward from problem.initial and backward from problem.goal at
+    the same time, always expanding the side whose best node has the lower f.
+    The inverse problem (see GraphProblem.inverse) starts at problem.goal, and
+    its actions lead from a state to its predecessors. Whenever the two searches reach a common
+    state we have a candidate solution; we stop when bound(f_top, f_inverse_top)
+    is no less than the cost of the best candidate. bound=max is the right rule
+    for consistent heuristics, and operator.add is the (stronger) rule when
+    f is just g."""
+    node, node_inverse = Node(problem.initial), Node(inverse.initial)
+    sides = [(problem, f, [(f(node), 0, node)], {node.state: node}),
+             (inverse, f_inverse, [(f_inverse(node_inverse), 0, node_inverse)],
+              {node_inverse.state: node_inverse})]
+    observe = observer(problem)
+    counter = 1
+    best, meeting = infinity, None
+    if node.state in sides[1][3]:
+        best, meeting = 0, (node, node_inverse)
+    while sides[0][2] and sides[1][2]:
+        tops = [side[2][0][0] for side in sides]
+        if best < infinity and bound(*tops) >= best:
+            break
+        observe(len(sides[0][2]) + len(sides[1][2]),
+                len(sides[0][3]) + len(sides[1][3]))
+        this, other = (0, 1) if tops[0] <= tops[1] else (1, 0)
+        p, fn, frontier, reached = sides[this]
+        _, _, node = heapq.heappop(frontier)
+        if reached[node.state] is not node:
+            continue  # A cheaper path to this state was found later
+        for child in node.expand(p):
+            if (child.state not in reached or
+                    child.path_cost < reached[child.state].path_cost):
+                reached[child.state] = child
+                heapq.heappush(frontier, (fn(child), counter, child))
+                counter += 1
+                partner = sides[other][3].get(child.state)
+                if partner and child.path_cost + partner.path_cost < best:
+                    best = child.path_cost + partner.path_cost
+                    meeting = (child, partner) if this == 0 else (partner, child)
+    if meeting is None:
+        return None
+    return join_bidirectional_path(problem, *meeting)
+
+
+def join_bidirectional_path(problem, node, node_inverse):
+    """Extend the forward node along the states of the backward node's path,
+    using the forward problem's actions, and return the final goal Node."""
+    for state in [n.state for n in reversed(node_inverse.path()[:-1])]:
+        children = [node.child_node(problem, action)
+                    for action in problem.actions(node.state)]
+        node = argmin([child for child in children if child.state == state],
+                      key=lambda child: child.path_cost)
+    return node
+
+
+def bidirectional_uniform_cost_search(problem):
+    """Uniform-cost search from both ends, meeting in the middle; it stops
+    when the two cheapest frontier costs add up to the best path found."""
+    g = lambda node: node.path_cost
+    return bidirectional_best_first_search(problem, problem.inverse(), g, g,
+                                           bound=operator.add)
+
+
+def bidirectional_astar_search(problem, h=None, h_inverse=None):
+    """A* search from both ends. The backward search uses h_inverse, or else
+    the h of problem.inverse(). Both heuristics should be consistent."""
+    inverse = problem.inverse()
+    h = memoize(h or problem.h, 'h')
+    h_inverse = memoize(h_inverse or inverse.h, 'h')
+    return bidirectional_best_first_search(
+        problem, inverse, lambda n: n.path_cost + h(n),
+        lambda n: n.path_cost + h_inverse(n))
+
 # ______________________________________________________________________________
 # Other search algorithms
 
@@ -322,8 +612,10 @@ def astar_search(problem, h=None):
 def recursive_best_first_search(problem, h=None):
     "[Figure 3.26]"
     h = memoize(h or problem.h, 'h')
+    observe = observer(problem)
 
-    def RBFS(problem, node, flimit):
+    def RBFS(problem, node, flimit, held=0):
+        # held is the number of successors kept by the calls above this one
         if problem.goal_test(node.state):
             return node, 0   # (The second value is immaterial)
         successors = node.expand(problem)
@@ -331,6 +623,8 @@ def recursive_best_first_search(problem, h=None):
             return None, infinity
         for s in successors:
             s.f = max(s.path_cost + h(s), node.f)
+        held += len(successors)
+        observe(held)
         while True:
             # Order by lowest f value
             successors.sort(key=lambda x: x.f)
@@ -341,7 +635,7 @@ def recursive_best_first_search(problem, h=None):
                 alternative = successors[1].f
             else:
                 alternative = infinity
-            result, best.f = RBFS(problem, best, min(flimit, alternative))
+            result, best.f = RBFS(problem, best, min(flimit, alternative), held)
             if result is not None:
                 return result, best.f
 
@@ -351,12 +645,121 @@ def recursive_best_first_search(problem, h=None):
     return result
 
 
+class MemoryBoundedNode(Node):
+
+    "A Node with the bookkeeping used by memory_bounded_astar_search."
+
+    __slots__ = ('children', 'forgotten', 'expanded', 'open_key')
+
+
+def memory_bounded_astar_search(problem, h=None, max_nodes=1000, stats=None):
+    """Simplified memory-bounded A* (SMA*). Works like A* on the search tree
+    until max_nodes nodes are in memory; then it forgets the worst leaf
+    (highest f, shallowest) and backs its f value up to its parent. A parent
+    with forgotten children stays on the fringe, keyed by the best
+    forgotten f, and regenerates those children only when that f is the best
+    on offer. Nodes too deep to fit in memory get f = infinity, a child whose
+    state is already on the path to the root is never made, and a forgotten
+    child with f = infinity is never regenerated, so an unsolvable problem
+    with cycles ends with None. If a stats dict is given, the numbers of
+    nodes expanded, forgotten and regenerated are stored in it."""
+    h = memoize(h or problem.h, 'h')
+    counts = dict(expanded=0, forgotten=0, regenerated=0)
+    observe = observer(problem)
+    fringe = []  # Sorted by (f, -depth, id): best node first, worst node last
+
+    def push(node, f):
+        node.open_key = (f, -node.depth, id(node))
+        bisect.insort(fringe, (node.open_key, node))
+
+    def discard(node):
+        if node.open_key is not None:
+            del fringe[bisect.bisect_left(fringe, (node.open_key,))]
+            node.open_key = None
+
+    def new_node(node, f):
+        node.f, node.children, node.forgotten = f, [], {}
+        node.expanded, node.open_key = False, None
+        push(node, f)
+
+    def on_path(node, state):
+        while node is not None:
+            if node.state == state:
+                return True
+            node = node.parent
+        return False
+
+    def worst_leaf():
+        for (_, node) in reversed(fringe):
+            if node.parent is not None and not node.children:
+                return node
+
+    root = MemoryBoundedNode(problem.initial)
+    new_node(root, h(root))
+    in_memory = 1
+    while fringe:
+        (f, _, _), node = fringe[0]
+        if f == infinity:
+            break
+        if problem.goal_test(node.state):
+            if stats is not None:
+                stats.update(counts)
+            return node
+        discard(node)
+        counts['expanded'] += 1
+        observe(len(fringe), in_memory)
+        # The f of each child is at least that of its parent and at least
+        # what it was backed up to when it was forgotten
+        if node.expanded:  # Regenerate the children that were forgotten
+            floors = {action: f for (action, f) in node.forgotten.items() if f < infinity}
+            for action in floors:
+                del node.forgotten[action]
+            children = [node.child_node(problem, action) for action in floors]
+            counts['regenerated'] += len(children)
+        else:
+            children = [child for child in node.expand(problem)
+                        if not on_path(node, child.state)]
+            floors = {}
+        node.expanded = True
+        for child in children:
+            if child.depth >= max_nodes - 1 and not problem.goal_test(child.state):
+                new_node(child, infinity)
+            else:
+                new_node(child, max(node.f, floors.get(child.action, 0),
+                                    child.path_cost + h(child)))
+        node.children.extend(children)
+        in_memory += len(children)
+        if not node.children:
+            node.f = infinity
+            push(node, infinity)
+        while in_memory > max_nodes:
+            worst = worst_leaf()
+            if worst is None:
+                break
+            discard(worst)
+            parent = worst.parent
+            parent.children.remove(worst)
+            parent.forgotten[worst.action] = worst.f
+            counts['forgotten'] += 1
+            in_memory -= 1
+            discard(parent)
+            forgotten_f = min(parent.forgotten.values())
+            if not parent.children:
+                parent.f = forgotten_f
+            push(parent, forgotten_f)
+    if stats is not None:
+        stats.update(counts)
+    return None
+
+
 def hill_climbing(problem):
     """From the initial node, keep choosing the neighbor with highest value,
     stopping when no neighbor is better. [Figure 4.2]"""
     current = Node(problem.initial)
+    observe = observer(problem)
     while True:
         neighbors = current.expand(problem)
+        observe(len(neighbors))
         if not neighbors:
             break
         neighbor = argmax_random_tie(neighbors,
@@ -367,25 +770,147 @@ def hill_climbing(problem):
     return current.state
 
 
+def first_choice_hill_climbing(problem, max_tries=100):
+    """Stochastic hill climbing that generates neighbors one at a time, at
+    random, and moves to the first one that is better than the current
+    state; it stops after max_tries neighbors in a row are no better. Only
+    the neighbors actually tried are built, which pays off when there are
+    many of them. [Section 4.1.1]"""
+    current, value = problem.initial, problem.value(problem.initial)
+    observe = observer(problem)
+    tries = 0
+    while tries < max_tries:
+        observe(1)
+        action = random_action(problem, current)
+        if action is None:
+            break
+        neighbor = problem.result(current, action)
+        neighbor_value = problem.value(neighbor)
+        if neighbor_value > value:
+            current, value, tries = neighbor, neighbor_value, 0
+        else:
+            tries += 1
+    return current
+
+
+def random_action(problem, state):
+    """A random action in state, or None if there are none. Uses the
+    problem's random_action method if it has one (so that a problem with a
+    huge number of actions can sample one without listing them all), else
+    picks from problem.actions(state)."""
+    if hasattr(problem, 'random_action'):
+        return problem.random_action(state)
+    actions = problem.actions(state)
+    if not isinstance(actions, (list, tuple)):
+        actions = list(actions)
+    return random.choice(actions) if actions else None
+
+
 def exp_schedule(k=20, lam=0.005, limit=100):
     "One possible schedule function for simulated annealing"
     return lambda t: (k * math.exp(-lam * t) if t < limit else 0)
 
 
+def linear_schedule(k=20, limit=100):
+    "A temperature that falls from k to 0 in a straight line over limit steps."
+    return lambda t: (k * (1 - t / limit) if t < limit else 0)
+
+
+def log_schedule(k=20, limit=100):
+    "The slow, logarithmic cooling of the classical convergence results."
+    return lambda t: (k / math.log(t + 2) if t < limit else 0)
+
+
 def simulated_annealing(problem, schedule=exp_schedule()):
-    "[Figure 4.5]"
+    """[Figure 4.5] Each step tries a single random successor, built from
+    random_action, rather than expanding all of them."""
     current = Node(problem.initial)
+    value = problem.value(current.state)
+    observe = observer(problem)
     for t in range(sys.maxsize):
+        observe(1)
         T = schedule(t)
         if T == 0:
             return current
-        neighbors = current.expand(problem)
-        if not neighbors:
+        action = random_action(problem, current.state)
+        if action is None:
             return current
-        next = random.choice(neighbors)
-        delta_e = problem.value(next.state) - problem.value(current.state)
+        next = current.child_node(problem, action)
+        next_value = problem.value(next.state)
+        delta_e = next_value - value
         if delta_e > 0 or probability(math.exp(delta_e / T)):
-            current = next
+            current, value = next, next_value
+
+
+def tabu_search(problem, tenure=10, max_steps=1000, sample=None):
+    """Move to the best neighbor that is not tabu, even when it is worse than
+    the current state; states visited in the last tenure steps are tabu,
+    unless they beat the best state seen so far. If sample is given, only
+    that many random neighbors are considered at each step. Returns the best
+    state seen. States must be hashable."""
+    current = best = problem.initial
+    best_value = problem.value(best)
+    recent = deque([current])
+    tabu = {current}
+    observe = observer(problem)
+    for _ in range(max_steps):
+        if sample is None:
+            actions = problem.actions(current)
+        else:
+            actions = [random_action(problem, current) for _ in range(sample)]
+        candidates = [problem.result(current, action)
+                      for action in actions if action is not None]
+        observe(len(candidates), len(tabu))
+        scored = [(value, s) for (value, s)
+                  in ((problem.value(s), s) for s in candidates)
+                  if s not in tabu or value > best_value]
+        if not scored:
+            break
+        value, current = max(scored, key=lambda pair: pair[0])
+        if value > best_value:
+            best, best_value = current, value
+        recent.append(current)
+        tabu.add(current)
+        if len(recent) > tenure:
+            tabu.discard(recent.popleft())
+    return best
+
+
+def random_restart_search(search, problem, restarts=10, random_state=None,
+                          processes=1, seed=None):
+    """Run a local search several times, each from a fresh random initial
+    state made by random_state() (by default problem.random_state, if the
+    problem has one). The restarts run through map_jobs with processes.
+    Restart i runs after random.seed(seed+i) if a seed is given. Returns the
+    best final state and a list with one dict of statistics per restart
+    (value, evaluation and successor counts and time)."""
+    random_state = random_state or getattr(problem, 'random_state', None)
+    jobs = [(search, problem, random_state, None if seed is None else seed + i)
+            for i in range(restarts)]
+    outcomes = list(map_jobs(run_restart, jobs, processes))
+    stats = []
+    for (i, (state, record)) in enumerate(outcomes):
+        record['restart'] = i
+        stats.append(record)
+    best = max(range(restarts), key=lambda i: stats[i]['value'])
+    return outcomes[best][0], stats
+
+
+def run_restart(search, problem, random_state, seed):
+    """One restart of random_restart_search: returns the final state and a
+    dict of statistics."""
+    if seed is not None:
+        random.seed(seed)
+    problem = copy.copy(problem)
+    if random_state is not None:
+        problem.initial = random_state()
+    p = InstrumentedProblem(problem)
+    start = time.perf_counter()
+    result = search(p)
+    state = result.state if isinstance(result, Node) else result
+    return state, dict(value=problem.value(state), evaluations=p.value_calls,
+                       expanded=p.succs, generated=p.states,
+                       wall_time=time.perf_counter() - start)
 
 
 def and_or_graph_search(problem):
@@ -423,12 +948,135 @@ def and_or_graph_search(problem):
     return or_search(problem.initial, problem, [])
 
 
+def and_or_policy_search(problem, h=None, cyclic=False):
+    """AND-OR search that returns its conditional plan as a policy: a dict
+    mapping each non-goal state the plan can reach to the action to take
+    there. Each state appears once however many branches reach it, so the
+    plan is a shared DAG rather than a nested tree. Returns None if there is
+    no plan. States must be hashable.
+    By default the plan must reach a goal in a bounded number of steps. The
+    search is depth-first and memoized: solved states and states that fail
+    whatever path led to them are cached, and actions are tried in order of
+    the largest h(state) among their outcomes. With cyclic=True the plan may
+    loop (try, try again): every state it reaches keeps a way to the goal,
+    and each action moves closer to the goal on at least one outcome, so it
+    reaches a goal with probability 1 as long as no outcome is starved."""
+    if cyclic:
+        return cyclic_and_or_search(problem)
+    policy = {}
+    solved = set()
+    failed = set()
+    path = set()
+
+    def or_search(state):
+        """Return (True, _) if state is solved, else (False, cycle), where
+        cycle is true when the failure depended on the current path."""
+        if state in solved:
+            return True, False
+        if state in failed:
+            return False, False
+        if problem.goal_test(state):
+            solved.add(state)
+            return True, False
+        if state in path:
+            return False, True
+        path.add(state)
+        actions = problem.actions(state)
+        if h is not None:
+            actions = sorted(actions, key=lambda action: max(
+                map(h, problem.result(state, action)), default=0))
+        cycle = False
+        for action in actions:
+            ok, on_path = and_search(problem.result(state, action))
+            if ok:
+                path.discard(state)
+                policy[state] = action
+                solved.add(state)
+                return True, False
+            cycle = cycle or on_path
+        path.discard(state)
+        if not cycle:
+            failed.add(state)
+        return False, cycle
+
+    def and_search(states):
+        for s in states:
+            ok, cycle = or_search(s)
+            if not ok:
+                return False, cycle
+        return True, False
+
+    if not or_search(problem.initial)[0]:
+        return None
+    return reachable_policy(problem, policy)
+
+
+def cyclic_and_or_search(problem):
+    """Find a policy that may loop but always keeps a way to the goal (a
+    strong cyclic plan) for and_or_policy_search. Every state reachable from
+    the initial state is explored once; then the states that can reach a
+    goal are found backwards from the goals, pruning any action with an
+    outcome outside that set, until nothing more is pruned."""
+    successors = {}
+    predecessors = defaultdict(list)
+    goals = {}
+    frontier = [problem.initial]
+    while frontier:
+        state = frontier.pop()
+        if state in successors or state in goals:
+            continue
+        if problem.goal_test(state):
+            goals[state] = 0
+            continue
+        successors[state] = []
+        for action in problem.actions(state):
+            results = problem.result(state, action)
+            outcomes = set(results)
+            successors[state].append((action, outcomes))
+            for s in results:
+                predecessors[s].append((state, action, outcomes))
+                frontier.append(s)
+    good = set(successors) | set(goals)
+    while True:
+        policy = {}
+        distance = dict(goals)
+        queue = deque(goals)
+        while queue:
+            s = queue.popleft()
+            for (state, action, outcomes) in predecessors[s]:
+                if state not in distance and outcomes <= good:
+                    distance[state] = distance[s] + 1
+                    policy[state] = action
+                    queue.append(state)
+        if len(distance) == len(good):
+            break
+        good = set(distance)
+    if problem.initial not in good:
+        return None
+    return reachable_policy(problem, policy)
+
+
+def reachable_policy(problem, policy):
+    "The part of policy that can be reached from the initial state."
+    reached = {}
+    frontier = [problem.initial]
+    while frontier:
+        state = frontier.pop()
+        if state in policy and state not in reached:
+            reached[state] = policy[state]
+            frontier.extend(problem.result(state, policy[state]))
+    return reached
+
+
 class OnlineDFSAgent:
 
     """The abstract class for an OnlineDFSAgent. Override update_state
     method to convert percept to state. While initializing the subclass
     a problem needs to be provided which is an instance of a subclass
-    of the Problem class. [Figure 4.21] """
+    of the Problem class. [Figure 4.21]
+    Alongside result, which maps (s, a) to the state it led to, the agent
+    keeps back[s1][s], the action that led from s1 to s, so that
+    backtracking does not have to scan the whole result table."""
 
     def __init__(self, problem):
         self.problem = problem
@@ -437,6 +1085,7 @@ class OnlineDFSAgent:
         self.untried = defaultdict(list)
         self.unbacktracked = defaultdict(list)
         self.result = {}
+        self.back = defaultdict(dict)
 
     def __call__(self, percept):
         s1 = self.update_state(percept)
@@ -444,21 +1093,18 @@ class OnlineDFSAgent:
             self.a = None
         else:
             if s1 not in self.untried.keys():
-                self.untried[s1] = self.problem.actions(s1)
+                self.untried[s1] = list(self.problem.actions(s1))
             if self.s is not None:
-                if s1 != self.result[(self.s, self.a)]:
+                if s1 != self.result.get((self.s, self.a)):
                     self.result[(self.s, self.a)] = s1
-                    unbacktracked[s1].insert(0, self.s)
+                    self.back[self.s][s1] = self.a
+                    self.unbacktracked[s1].insert(0, self.s)
             if len(self.untried[s1]) == 0:
                 if len(self.unbacktracked[s1]) == 0:
                     self.a = None
                 else:
-                    # else a <- an action b such that result[s', b] = POP(unbacktracked[s'])  # noqa
-                    unbacktracked_pop = self.unbacktracked[s1].pop(0)  # noqa
-                    for (s, b) in self.result.keys():
-                        if self.result[(s, b)] == unbacktracked_pop:
-                            self.a = b
-                            break
+                    # a <- an action b such that result[s', b] = POP(unbacktracked[s'])
+                    self.a = self.back[s1].get(self.unbacktracked[s1].pop(0))
             else:
                 self.a = self.untried[s1].pop(0)
         self.s = s1
@@ -519,10 +1165,10 @@ class LRTAStarAgent:
     Takes a OnlineSearchProblem [Figure 4.23] as a problem
     """
 
-    def __init__(self, problem):
+    def __init__(self, problem, H=None):
         self.problem = problem
         # self.result = {}      # no need as we are using problem.result
-        self.H = {}
+        self.H = HeuristicTable() if H is None else H
         self.s = None
         self.a = None
 
@@ -554,16 +1200,114 @@ class LRTAStarAgent:
         Returns cost to move from state 's' to state 's1' plus
         estimated cost to get to goal from s1
         """
-        print(s, a, s1)
         if s1 is None:
             return self.problem.h(s)
+        elif s1 in H:
+            return self.problem.c(s, a, s1) + H[s1]
         else:
-            # sometimes we need to get H[s1] which we haven't yet added to H
-            # to replace this try, except: we can initialize H with values from problem.h
-            try:
-                return self.problem.c(s, a, s1) + self.H[s1]
-            except:
-                return self.problem.c(s, a, s1) + self.problem.h(s1)
+            # we may need H[s1] before s1 has been visited and added to H
+            return self.problem.c(s, a, s1) + self.problem.h(s1)
+
+
+class HeuristicTable:
+
+    """The heuristic values learned by an online agent such as LRTAStarAgent,
+    used like a dict from states to numbers. Each state gets an integer id
+    when first stored, and the values are kept in a flat array indexed by
+    id, so a table with many states takes 8 bytes per value rather than a
+    float object each. Save it with save, and pass the table read back by
+    load_heuristic_table to a new agent to warm-start it."""
+
+    def __init__(self, items=()):
+        self.names = []
+        self.ids = {}
+        self.values = array('d')
+        for (state, value) in items:
+            self[state] = value
+
+    def id(self, state):
+        "Return the integer id of a state, assigning a new one if needed."
+        if state not in self.ids:
+            self.ids[state] = len(self.names)
+            self.names.append(state)
+            self.values.append(0)
+        return self.ids[state]
+
+    def __getitem__(self, state):
+        return self.values[self.ids[state]]
+
+    def __setitem__(self, state, value):
+        self.values[self.id(state)] = value
+
+    def __contains__(self, state):
+        return state in self.ids
+
+    def __len__(self):
+        return len(self.names)
+
+    def get(self, state, default=None):
+        i = self.ids.get(state)
+        return default if i is None else self.values[i]
+
+    def items(self):
+        return zip(self.names, self.values)
+
+    def save(self, file):
+        "Write the table to a file opened in binary mode."
+        pickle.dump((self.names, self.values.tobytes()), file)
+
+
+def load_heuristic_table(file):
+    "Read a HeuristicTable written by HeuristicTable.save from a binary file."
+    table = HeuristicTable()
+    names, values = pickle.load(file)
+    table.names = names
+    table.ids = {state: i for (i, state) in enumerate(names)}
+    table.values.frombytes(values)
+    return table
+
+
+def run_online_agent(agent, problem, max_steps=1000):
+    """Put an online agent in problem's initial state and let it act, with
+    each percept being the current state and problem.output giving the next
+    one, until it returns None or max_steps actions have been taken. Returns
+    the list of states visited."""
+    state = problem.initial
+    states = [state]
+    for _ in range(max_steps):
+        action = agent(state)
+        if action is None:
+            break
+        state = problem.output(state, action)
+        states.append(state)
+    return states
+
+
+def batch_online_search(agent_class, problems, trials=1, max_steps=1000,
+                        processes=1, **kwargs):
+    """For each problem, make one agent_class(problem, **kwargs) and run it
+    trials times with run_online_agent, keeping what it learns from one trial
+    to the next. Pass H=table in kwargs to warm-start LRTAStarAgent agents;
+    each problem gets its own copy of kwargs, so the table is left unchanged.
+    The problems run through map_jobs with processes. Returns one dict per
+    problem with the number of steps and whether the goal was reached in
+    each trial, and the agent itself (whose table, such as agent.H, can be
+    saved)."""
+    jobs = [(agent_class, problem, trials, max_steps, copy.deepcopy(kwargs))
+            for problem in problems]
+    return list(map_jobs(run_online_trials, jobs, processes))
+
+
+def run_online_trials(agent_class, problem, trials, max_steps, kwargs):
+    "The trials of one problem in batch_online_search."
+    agent = agent_class(problem, **kwargs)
+    steps, solved = [], []
+    for _ in range(trials):
+        agent.s = agent.a = None
+        states = run_online_agent(agent, problem, max_steps)
+        steps.append(len(states) - 1)
+        solved.append(problem.goal_test(states[-1]))
+    return dict(steps=steps, solved=solved, agent=agent)
 
 # ______________________________________________________________________________
 # Genetic Algorithm
@@ -580,19 +1324,94 @@ def genetic_search(problem, fitness_fn, ngen=1000, pmut=0.1, n=20):
     return genetic_algorithm(states[:n], problem.value, ngen, pmut)
 
 
-def genetic_algorithm(population, fitness_fn, ngen=1000, pmut=0.1):
-    "[Figure 4.8]"
-    for i in range(ngen):
-        new_population = []
-        for i in len(population):
-            fitnesses = map(fitness_fn, population)
-            p1, p2 = weighted_sample_with_replacement(population, fitnesses, 2)
-            child = p1.mate(p2)
+def genetic_algorithm(population, fitness_fn, ngen=1000, pmut=0.1,
+                      selection=None, crossover=None, mutation=None,
+                      elitism=0, evaluate=None, patience=None):
+    """[Figure 4.8], with pluggable operators. Each generation the whole
+    population is scored once, by evaluate(population) if given (e.g. a
+    ParallelFitness, or a function scoring a NumPy matrix of genes in one
+    vectorized call) or else by fitness_fn on each individual. Parents are
+    drawn by selection(population, fitnesses), which returns a sampling
+    function: roulette_selection (the default) or tournament_selection(k).
+    Children are crossover(p1, p2) (default p1.mate(p2)), and with
+    probability pmut are changed in place by mutation(child) (default
+    child.mutate()). The elitism best individuals are carried over
+    unchanged. If patience is given, stop after that many generations
+    without improvement. Returns the fittest individual seen."""
+    evaluate = evaluate or (lambda population: list(map(fitness_fn, population)))
+    selection = selection or roulette_selection
+    crossover = crossover or (lambda p1, p2: p1.mate(p2))
+    mutation = mutation or (lambda child: child.mutate())
+    best, best_fitness, stale = None, -infinity, 0
+    for generation in range(ngen + 1):
+        fitnesses = evaluate(population)
+        i = max(range(len(population)), key=fitnesses.__getitem__)
+        if fitnesses[i] > best_fitness:
+            best, best_fitness, stale = population[i], fitnesses[i], 0
+        else:
+            stale += 1
+        if generation == ngen or (patience is not None and stale >= patience):
+            break
+        sample = selection(population, fitnesses)
+        elite = sorted(range(len(population)), key=fitnesses.__getitem__,
+                       reverse=True)[:elitism]
+        new_population = [population[j] for j in elite]
+        while len(new_population) < len(population):
+            child = crossover(sample(), sample())
             if random.uniform(0, 1) < pmut:
-                child.mutate()
+                mutation(child)
             new_population.append(child)
         population = new_population
-    return argmax(population, key=fitness_fn)
+    return best
+
+
+def roulette_selection(population, fitnesses):
+    """Fitness-proportionate selection. The cumulative weights are built once
+    per generation, and each draw is a binary search over them."""
+    return weighted_sampler(population, fitnesses)
+
+
+def tournament_selection(k=2):
+    """Return a selection operator that draws k individuals at random and
+    keeps the fittest of them."""
+    def selection(population, fitnesses):
+        n = len(population)
+
+        def sample():
+            return population[max(random.sample(range(n), min(k, n)),
+                                  key=fitnesses.__getitem__)]
+        return sample
+    return selection
+
+
+class ParallelFitness:
+
+    """Evaluate a fitness function over a population in a pool of worker
+    processes, for use as genetic_algorithm(..., evaluate=ParallelFitness(f)).
+    The pool is started on first use; close it (or use a with statement)
+    when done. fitness_fn and the individuals must be picklable."""
+
+    def __init__(self, fitness_fn, processes=None, chunksize=None):
+        self.fitness_fn = fitness_fn
+        self.processes = processes
+        self.chunksize = chunksize
+        self.pool = None
+
+    def __call__(self, population):
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.processes)
+        return self.pool.map(self.fitness_fn, population, self.chunksize)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
 
 class GAState:
@@ -670,12 +1489,152 @@ class Graph:
         "Return a list of nodes in the graph."
         return list(self.dict.keys())
 
+    def reversed(self):
+        """Return a graph with every link reversed. An undirected graph is
+        its own reverse."""
+        if not self.directed:
+            return self
+        g = Graph({node: {} for node in self.dict})
+        for (a, links) in self.dict.items():
+            for (b, distance) in links.items():
+                g.connect1(b, a, distance)
+        for attr in ('locations', 'least_costs'):
+            if hasattr(self, attr):
+                setattr(g, attr, getattr(self, attr))
+        return g
+
 
 def UndirectedGraph(dict=None):
     "Build a Graph where every edge (including future ones) goes both ways."
     return Graph(dict=dict, directed=False)
 
 
+class CompactGraph:
+
+    """A graph with the same get/connect/nodes interface as Graph, stored in
+    compressed sparse row form for graphs with millions of edges. Each node
+    name gets an integer id; the links out of node i are
+    targets[offsets[i]:offsets[i+1]] (sorted by id), with lengths at the same
+    positions of weights. All three are flat arrays, so an edge costs a few
+    bytes rather than a dict entry. Build one from (A, B, distance) triples:
+        g = CompactGraph([('A', 'B', 1), ('A', 'C', 2)], directed=False)
+    or with compact_graph(Graph) or load_compact_graph(file). The arrays are
+    fixed once built; links added later with connect are kept in a small
+    dict on the side."""
+
+    def __init__(self, edges=(), directed=True):
+        self.directed = directed
+        self.names = []
+        self.ids = {}
+        rows = defaultdict(list)
+        for edge in edges:
+            a, b = self.id(edge[0]), self.id(edge[1])
+            distance = edge[2] if len(edge) > 2 else 1
+            rows[a].append((b, distance))
+            if not directed:
+                rows[b].append((a, distance))
+        integral = all(isinstance(d, int)
+                       for links in rows.values() for (_, d) in links)
+        self.offsets = array('q', [0])
+        self.targets = array('i' if len(self.names) < 2 ** 31 else 'q')
+        self.weights = array('q' if integral else 'd')
+        for i in range(len(self.names)):
+            links = dict(rows.pop(i, ()))  # A later duplicate link wins
+            for b in sorted(links):
+                self.targets.append(b)
+                self.weights.append(links[b])
+            self.offsets.append(len(self.targets))
+        self.extra = {}
+
+    def id(self, name):
+        "Return the integer id of a node name, assigning a new one if needed."
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def connect(self, A, B, distance=1):
+        """Add a link from A and B of given distance, and also add the inverse
+        link if the graph is undirected."""
+        self.connect1(A, B, distance)
+        if not self.directed:
+            self.connect1(B, A, distance)
+
+    def connect1(self, A, B, distance):
+        "Add a link from A to B of given distance, in one direction only."
+        self.extra.setdefault(A, {})[B] = distance
+
+    def get(self, a, b=None):
+        """Return a link distance or a dict of {node: distance} entries.
+        .get(a,b) returns the distance or None;
+        .get(a) returns a dict of {node: distance} entries, possibly {}."""
+        i = self.ids.get(a)
+        if b is not None:
+            if b in self.extra.get(a, ()):
+                return self.extra[a][b]
+            j = self.ids.get(b)
+            if i is None or j is None:
+                return None
+            lo, hi = self.offsets[i], self.offsets[i + 1]
+            k = bisect.bisect_left(self.targets, j, lo, hi)
+            return self.weights[k] if k < hi and self.targets[k] == j else None
+        links = {}
+        if i is not None:
+            names, weights = self.names, self.weights
+            for k in range(self.offsets[i], self.offsets[i + 1]):
+                links[names[self.targets[k]]] = weights[k]
+        links.update(self.extra.get(a, ()))
+        return links
+
+    def nodes(self):
+        "Return a list of nodes in the graph."
+        return self.names + [a for a in self.extra if a not in self.ids]
+
+    def edges(self):
+        "Yield every link as an (A, B, distance) triple."
+        names = self.names
+        for i in range(len(names)):
+            for k in range(self.offsets[i], self.offsets[i + 1]):
+                if (names[self.targets[k]] not in self.extra.get(names[i], ())):
+                    yield names[i], names[self.targets[k]], self.weights[k]
+        for (a, links) in self.extra.items():
+            for (b, distance) in links.items():
+                yield a, b, distance
+
+    def reversed(self):
+        """Return a graph with every link reversed. An undirected graph is
+        its own reverse."""
+        if not self.directed:
+            return self
+        g = CompactGraph(((b, a, d) for (a, b, d) in self.edges()))
+        if hasattr(self, 'locations'):
+            g.locations = self.locations
+        return g
+
+
+def compact_graph(graph):
+    "Copy a Graph (including its locations, if any) into a CompactGraph."
+    g = CompactGraph((a, b, distance)
+                     for a in graph.nodes()
+                     for (b, distance) in graph.get(a).items())
+    g.directed = graph.directed
+    if hasattr(graph, 'locations'):
+        g.locations = graph.locations
+    return g
+
+
+def load_compact_graph(file, directed=True):
+    """Read a CompactGraph from an open file of edges, one 'A B distance'
+    line per edge (distance defaults to 1). Blank lines and lines starting
+    with '#' are skipped; node names that look like numbers become numbers."""
+    def edges():
+        for line in file:
+            fields = line.split()
+            if fields and not fields[0].startswith('#'):
+                yield tuple(map(num_or_str, fields))
+    return CompactGraph(edges(), directed)
+
+
 def RandomGraph(nodes=list(range(10)), min_links=2, width=400, height=300,
                 curvature=lambda: random.uniform(1.1, 1.5)):
     """Construct a random graph, with the specified nodes, and random links.
@@ -805,6 +1764,11 @@ class GraphProblem(Problem):
     def path_cost(self, cost_so_far, A, action, B):
         return cost_so_far + (self.graph.get(A, B) or infinity)
 
+    def inverse(self):
+        """The problem of searching backward from goal to initial over the
+        reversed graph, for bidirectional search."""
+        return GraphProblem(self.goal, self.initial, self.graph.reversed())
+
     def h(self, node):
         "h function is straight-line distance from a node's state to goal."
         locs = getattr(self.graph, 'locations', None)
@@ -814,6 +1778,107 @@ class GraphProblem(Problem):
             return infinity
 
 
+def graph_distances(graph, source):
+    "Dijkstra's algorithm: return a dict of {node: distance from source}."
+    dist = {source: 0}
+    frontier = [(0, 0, source)]
+    counter = 1
+    while frontier:
+        d, _, a = heapq.heappop(frontier)
+        if d > dist[a]:
+            continue
+        for (b, length) in graph.get(a).items():
+            if d + length < dist.get(b, infinity):
+                dist[b] = d + length
+                heapq.heappush(frontier, (d + length, counter, b))
+                counter += 1
+    return dist
+
+
+class Landmarks:
+
+    """Precomputed distances to and from a few landmark nodes, which give an
+    admissible heuristic for any goal by the triangle inequality (the ALT
+    heuristic of Goldberg and Harrelson):
+        d(a, goal) >= d(L, goal) - d(L, a)  and  d(a, goal) >= d(a, L) - d(goal, L)
+    Build once per graph and use for many queries:
+        landmarks = Landmarks(graph, k=8)
+        astar_search(problem, landmarks.heuristic(problem.goal))
+    Landmarks are picked by farthest-first selection unless given. Each table
+    is an array of doubles indexed by node position, and the whole set can be
+    written with save and read back with load_landmarks."""
+
+    def __init__(self, graph, k=8, landmarks=None):
+        nodes = list(graph.nodes())
+        self.index = {node: i for (i, node) in enumerate(nodes)}
+        for a in nodes:
+            for b in graph.get(a):
+                if b not in self.index:
+                    self.index[b] = len(self.index)
+        self.directed = graph.directed
+        reverse = graph.reversed() if self.directed else graph
+        if landmarks is None:
+            landmarks = self.farthest_landmarks(graph, k)
+        self.landmarks = list(landmarks)
+        self.dist_from = [self.table(graph_distances(graph, L))
+                          for L in self.landmarks]
+        self.dist_to = ([self.table(graph_distances(reverse, L))
+                         for L in self.landmarks]
+                        if self.directed else self.dist_from)
+
+    def farthest_landmarks(self, graph, k):
+        """Start from a random node, then repeatedly add the node farthest
+        from the landmarks chosen so far."""
+        nearest = {node: infinity for node in self.index}
+        landmarks = [random.choice(list(self.index))]
+        while len(landmarks) < min(k, len(self.index)):
+            for (node, d) in graph_distances(graph, landmarks[-1]).items():
+                nearest[node] = min(nearest[node], d)
+            candidates = [node for node in nearest
+                          if node not in landmarks and nearest[node] < infinity]
+            if not candidates:
+                break
+            landmarks.append(argmax(candidates, key=nearest.get))
+        return landmarks
+
+    def table(self, dist):
+        "Convert a dict of distances into an array indexed like self.index."
+        t = array('d', [infinity]) * len(self.index)
+        for (node, d) in dist.items():
+            t[self.index[node]] = d
+        return t
+
+    def estimate(self, a, goal):
+        "A lower bound on the distance from node a to node goal."
+        i, j = self.index.get(a), self.index.get(goal)
+        if i is None or j is None:
+            return 0
+        best = 0
+        for (dist_from, dist_to) in zip(self.dist_from, self.dist_to):
+            if dist_from[i] < infinity and dist_from[j] < infinity:
+                best = max(best, dist_from[j] - dist_from[i])
+            if dist_to[i] < infinity and dist_to[j] < infinity:
+                best = max(best, dist_to[i] - dist_to[j])
+        return best
+
+    def heuristic(self, goal):
+        "Return an h(node) function for searching toward goal."
+        return lambda node: self.estimate(node.state, goal)
+
+    def save(self, file):
+        "Write the landmark tables to a file opened in binary mode."
+        pickle.dump((self.index, self.directed, self.landmarks,
+                     self.dist_from, self.dist_to), file)
+
+
+def load_landmarks(file):
+    "Read Landmarks written by Landmarks.save from a binary file."
+    landmarks = Landmarks.__new__(Landmarks)
+    (landmarks.index, landmarks.directed, landmarks.landmarks,
+     landmarks.dist_from, landmarks.dist_to) = pickle.load(file)
+    return landmarks
+
+
 class GraphProblemStochastic(GraphProblem):
     """
     A version of GraphProblem where an action can lead to
@@ -830,6 +1895,157 @@ class GraphProblemStochastic(GraphProblem):
         raise NotImplementedError
 
 
+# ______________________________________________________________________________
+# Path finding on occupancy grids
+
+
+class GridProblem(Problem):
+
+    """The problem of finding a path between two (x, y) cells of an occupancy
+    grid, where grid[y][x] is true for a blocked cell (a list of lists or a
+    2-d NumPy array will do). Actions are (dx, dy) steps to one of the 4 or,
+    with diagonal=True, 8 neighboring free cells; straight steps cost 1 and
+    diagonal steps sqrt(2). Diagonal steps may not cut the corner of a
+    blocked cell. The heuristic is the octile distance (Manhattan distance on
+    4-connected grids), which is exact on an empty grid."""
+
+    def __init__(self, initial, goal, grid, diagonal=True):
+        Problem.__init__(self, initial, goal)
+        self.grid = grid
+        self.diagonal = diagonal
+        self.height, self.width = len(grid), len(grid[0])
+        self.directions = ([(1, 0), (0, 1), (-1, 0), (0, -1),
+                            (1, 1), (-1, 1), (-1, -1), (1, -1)]
+                           if diagonal else orientations)
+
+    def free(self, x, y):
+        "Is (x, y) a cell on the grid that is not blocked?"
+        return (0 <= x < self.width and 0 <= y < self.height and
+                not self.grid[y][x])
+
+    def actions(self, state):
+        x, y = state
+        return [(dx, dy) for (dx, dy) in self.directions
+                if self.free(x + dx, y + dy) and
+                (dx == 0 or dy == 0 or
+                 (self.free(x + dx, y) and self.free(x, y + dy)))]
+
+    def result(self, state, action):
+        return vector_add(state, action)
+
+    def path_cost(self, c, state1, action, state2):
+        return c + (sqrt2 if action[0] and action[1] else 1)
+
+    def h(self, node):
+        "Octile distance (Manhattan if diagonal moves are not allowed)."
+        dx = abs(node.state[0] - self.goal[0])
+        dy = abs(node.state[1] - self.goal[1])
+        if self.diagonal:
+            return max(dx, dy) + (sqrt2 - 1) * min(dx, dy)
+        return dx + dy
+
+
+sqrt2 = math.sqrt(2)
+
+
+def jump_point_search(problem):
+    """Jump Point Search (Harabor and Grastien) for a GridProblem: A* that
+    only puts 'jump points' on the frontier. From each jump point it scans
+    straight and diagonal lines, skipping over cells whose optimal paths
+    need not branch, and stops at the goal or at a cell with a forced
+    neighbor. On open maps this expands orders of magnitude fewer nodes than
+    astar_search with the same (optimal) result. The returned Node has one
+    step per action, like the other searchers."""
+    free, goal = problem.free, problem.goal
+
+    def jump(x, y, dx, dy):
+        "Step from (x - dx, y - dy) in direction (dx, dy); return a jump point."
+        while True:
+            if not free(x, y):
+                return None
+            if (x, y) == goal:
+                return x, y
+            if dx and dy:
+                if jump(x + dx, y, dx, 0) or jump(x, y + dy, 0, dy):
+                    return x, y
+                if not (free(x + dx, y) and free(x, y + dy)):
+                    return None
+            elif dx:
+                if ((free(x, y - 1) and not free(x - dx, y - 1)) or
+                        (free(x, y + 1) and not free(x - dx, y + 1))):
+                    return x, y
+            elif problem.diagonal:
+                if ((free(x - 1, y) and not free(x - 1, y - dy)) or
+                        (free(x + 1, y) and not free(x + 1, y - dy))):
+                    return x, y
+            elif jump(x + 1, y, 1, 0) or jump(x - 1, y, -1, 0):
+                return x, y  # On 4-connected grids, vertical scans look sideways
+            x, y = x + dx, y + dy
+
+    def directions(state, parent):
+        "The directions worth scanning from state, having come from parent."
+        if parent is None:
+            return problem.actions(state)
+        x, y = state
+        dx = (x > parent[0]) - (x < parent[0])
+        dy = (y > parent[1]) - (y < parent[1])
+        if dx and dy:
+            candidates = [(0, dy), (dx, 0), (dx, dy)]
+        elif not problem.diagonal:
+            candidates = [(dx, dy), (dy, dx), (-dy, -dx)]
+        elif dx:
+            candidates = [(dx, 0), (0, 1), (0, -1)]
+            if free(x + dx, y):
+                candidates += [(dx, 1), (dx, -1)]
+        else:
+            candidates = [(0, dy), (1, 0), (-1, 0)]
+            if free(x, y + dy):
+                candidates += [(1, dy), (-1, dy)]
+        legal = problem.actions(state)
+        return [d for d in candidates if d in legal]
+
+    def line_cost(a, b):
+        dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+        return max(dx, dy) + (sqrt2 - 1) * min(dx, dy)
+
+    start = problem.initial
+    g, parent = {start: 0}, {start: None}
+    frontier = [(problem.h(Node(start)), 0, start)]
+    counter = itertools.count(1)
+    observe = observer(problem)
+    while frontier:
+        observe(len(frontier), len(g))
+        _, _, state = heapq.heappop(frontier)
+        if state == goal:
+            return grid_path_node(problem, state, parent)
+        for (dx, dy) in directions(state, parent[state]):
+            point = jump(state[0] + dx, state[1] + dy, dx, dy)
+            if point is None:
+                continue
+            cost = g[state] + line_cost(state, point)
+            if cost < g.get(point, infinity):
+                g[point], parent[point] = cost, state
+                heapq.heappush(frontier, (cost + problem.h(Node(point)),
+                                          next(counter), point))
+    return None
+
+
+def grid_path_node(problem, state, parent):
+    """Turn the chain of jump points ending at state into a chain of Nodes,
+    one per single-cell step."""
+    points = []
+    while state is not None:
+        points.append(state)
+        state = parent[state]
+    points.reverse()
+    node = Node(points[0])
+    for point in points[1:]:
+        while node.state != point:
+            x, y = node.state
+            action = ((point[0] > x) - (point[0] < x), (point[1] > y) - (point[1] < y))
+            node = node.child_node(problem, action)
+    return node
+
 # ______________________________________________________________________________
 
 
@@ -956,6 +2172,16 @@ def boggle_neighbors(n2, cache={}):
     return neighbors
 
 
+def boggle_distances(n2, cache={}):
+    """Return a list of lists: the number of moves between squares i and j
+    is the [i][j] element."""
+    if n2 not in cache:
+        n = exact_sqrt(n2)
+        cache[n2] = [[max(abs(i // n - j // n), abs(i % n - j % n))
+                      for j in range(n2)] for i in range(n2)]
+    return cache[n2]
+
+
 def exact_sqrt(n2):
     "If n2 is a perfect square, return its square root, else raise error."
     n = int(math.sqrt(n2))
@@ -965,6 +2191,47 @@ def exact_sqrt(n2):
 # _____________________________________________________________________________
 
 
+class Trie:
+
+    """A letter tree over a list of words. Each node has a dict of children,
+    the word that ends at the node (or None) and its height: the length of
+    the longest word continuing below it. BoggleFinder walks down a Trie one
+    board cell at a time instead of binary-searching for each prefix."""
+
+    __slots__ = ('children', 'word', 'height')
+
+    def __init__(self, words=()):
+        self.children = {}
+        self.word = None
+        self.height = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        node = self
+        for (depth, c) in enumerate(word):
+            node.height = max(node.height, len(word) - depth)
+            node = node.children.get(c) or node.children.setdefault(c, Trie())
+        node.word = word
+
+    def child(self, c):
+        "The node below this one for letter c, or None."
+        return self.children.get(c)
+
+    def lookup(self, prefix):
+        "The node for prefix, or None if no word starts with prefix."
+        node = self
+        for c in prefix:
+            node = node.child(c)
+            if node is None:
+                return None
+        return node
+
+    def __contains__(self, word):
+        node = self.lookup(word)
+        return node is not None and node.word is not None
+
+
 class Wordlist:
 
     """This class holds a list of words. You can use (word in wordlist)
@@ -980,6 +2247,7 @@ class Wordlist:
             c2 = chr(ord(c) + 1)
             self.bounds[c] = (bisect.bisect(self.words, c),
                               bisect.bisect(self.words, c2))
+        self._trie = None
 
     def lookup(self, prefix, lo=0, hi=None):
         """See if prefix is in dictionary, as a full word or as a prefix.
@@ -1001,19 +2269,166 @@ class Wordlist:
     def __len__(self):
         return len(self.words)
 
+    def trie(self):
+        "A Trie of the words, built the first time it is asked for."
+        if self._trie is None:
+            if isinstance(self.words, MappedWords):
+                self._trie = self.words.trie()
+            else:
+                self._trie = Trie(self.words)
+        return self._trie
+
+    def __getstate__(self):
+        "Pickle without the cached Trie, which trie() rebuilds when needed."
+        return dict(self.__dict__, _trie=None)
+
+    def save(self, file):
+        """Write the sorted words, their letter bounds and the nodes of their
+        Trie to a file opened in binary mode, in the compiled format read by
+        load_wordlist."""
+        blob = '\n'.join(self.words).encode('ascii')
+        offsets = array('q', [0])
+        for word in self.words:
+            offsets.append(offsets[-1] + len(word) + 1)
+        bounds = array('q', [b for c in ALPHABET for b in self.bounds[c]])
+        index = {word: i for (i, word) in enumerate(self.words)}
+        nodes = array('i')
+        # A node is [word index or -1, height, number of children], then a
+        # (letter code, node offset) pair for each child, all in nodes
+        stack = [(Trie(self.words), None)]
+        while stack:
+            node, parent_slot = stack.pop()
+            if parent_slot is not None:
+                nodes[parent_slot] = len(nodes)
+            children = sorted(node.children.items())
+            nodes.extend([-1 if node.word is None else index[node.word],
+                          node.height, len(children)])
+            for (c, child) in children:
+                stack.append((child, len(nodes) + 1))
+                nodes.extend([ord(c), 0])
+        file.write(wordlist_magic)
+        file.write(array('q', [len(self.words), len(blob), len(nodes)]).tobytes())
+        file.write(offsets.tobytes())
+        file.write(bounds.tobytes())
+        file.write(nodes.tobytes())
+        file.write(blob)
+
+
+wordlist_magic = b'AIMAWL02'
+
+
+def load_wordlist(file):
+    """Read a Wordlist written by Wordlist.save from a binary file. The file
+    is memory-mapped rather than read, so nothing is parsed, sorted or built
+    at load time and processes that load the same file share its pages; the
+    words are decoded, and the trie walked, straight from the mapped file.
+    A Wordlist loaded this way pickles as the name of its file, so it can be
+    sent cheaply to worker processes."""
+    words = MappedWords(file)
+    wordlist = Wordlist.__new__(Wordlist)
+    wordlist.words = words
+    wordlist.bounds = {c: (words.bounds[2 * i], words.bounds[2 * i + 1])
+                       for (i, c) in enumerate(ALPHABET)}
+    wordlist._trie = None
+    return wordlist
+
+
+class MappedWords:
+
+    """The sorted words of a memory-mapped compiled wordlist, as a read-only
+    sequence of strings."""
+
+    def __init__(self, file):
+        self.filename = file.name
+        self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        if view[:8] != wordlist_magic:
+            raise ValueError('not a compiled wordlist: %r' % self.filename)
+        n, size, trie_size = view[8:32].cast('q')
+        start = 32 + 8 * (n + 1)
+        self.offsets = view[32:start].cast('q')
+        self.bounds = view[start:start + 8 * 52].cast('q')
+        start += 8 * 52
+        self.nodes = view[start:start + 4 * trie_size].cast('i')
+        self.start = start + 4 * trie_size
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError('word index out of range')
+        start = self.start
+        return self.map[start + self.offsets[i]:
+                        start + self.offsets[i + 1] - 1].decode('ascii')
+
+    def __iter__(self):
+        if not self.n:
+            return iter(())
+        return iter(self.map[self.start:].decode('ascii').split('\n'))
+
+    def trie(self):
+        "The root of the Trie stored in the file."
+        return MappedTrie(self, 0)
+
+    def __reduce__(self):
+        return (mapped_words, (self.filename,))
+
+
+def mapped_words(filename):
+    "Memory-map the compiled wordlist in the named file."
+    with open(filename, 'rb') as file:
+        return MappedWords(file)
+
+
+class MappedTrie:
+
+    """A node of the Trie in a compiled wordlist, read from the mapped file,
+    with the child, word and height of a Trie node."""
+
+    __slots__ = ('words', 'offset', 'word', 'height')
+
+    def __init__(self, words, offset):
+        self.words = words
+        self.offset = offset
+        i, self.height = words.nodes[offset:offset + 2]
+        self.word = None if i < 0 else words[i]
+
+    def child(self, c):
+        "The node below this one for letter c, or None."
+        nodes, offset, code = self.words.nodes, self.offset, ord(c)
+        for k in range(offset + 3, offset + 3 + 2 * nodes[offset + 2], 2):
+            if nodes[k] == code:
+                return MappedTrie(self.words, nodes[k + 1])
+        return None
+
+    lookup = Trie.lookup
+    __contains__ = Trie.__contains__
+
 # _____________________________________________________________________________
 
 
 class BoggleFinder:
 
-    """A class that allows you to find all the words in a Boggle board. """
+    """A class that allows you to find all the words in a Boggle board.
+    self.found maps each word to the number of paths that spell it, and
+    self.paths holds every such path as a pair (bitmask of squares, word),
+    so that set_cell can re-score a board after a one-letter change by
+    exploring only the paths through that square."""
 
     wordlist = None  # A class variable, holding a wordlist
 
-    def __init__(self, board=None):
-        if BoggleFinder.wordlist is None:
+    def __init__(self, board=None, wordlist=None):
+        if wordlist is not None:
+            self.wordlist = wordlist
+        elif BoggleFinder.wordlist is None:
             BoggleFinder.wordlist = Wordlist(DataFile("EN-text/wordlist.txt"))
+        self.trie = self.wordlist.trie()
         self.found = {}
+        self.paths = []
         if board:
             self.set_board(board)
 
@@ -1023,30 +2438,55 @@ class BoggleFinder:
             board = random_boggle()
         self.board = board
         self.neighbors = boggle_neighbors(len(board))
+        self.distances = boggle_distances(len(board))
         self.found = {}
+        self.paths = []
         for i in range(len(board)):
-            lo, hi = self.wordlist.bounds[board[i]]
-            self.find(lo, hi, i, [], '')
+            self.find(self.trie, i, 0)
         return self
 
-    def find(self, lo, hi, i, visited, prefix):
-        """Looking in square i, find the words that continue the prefix,
-        considering the entries in self.wordlist.words[lo:hi], and not
-        revisiting the squares in visited."""
-        if i in visited:
+    def set_cell(self, i, c):
+        """Put letter c in square i, and update the words found by dropping
+        the paths through square i and searching again only for paths
+        through square i."""
+        bit = 1 << i
+        kept = []
+        found = self.found
+        for path in self.paths:
+            if path[0] & bit:
+                word = path[1]
+                found[word] -= 1
+                if not found[word]:
+                    del found[word]
+            else:
+                kept.append(path)
+        self.paths = kept
+        self.board[i] = c
+        for j in range(len(self.board)):
+            self.find(self.trie, j, 0, i)
+        return self
+
+    def find(self, node, i, visited, through=None):
+        """Looking in square i, find the words that continue the prefix
+        spelled by the trie node, not revisiting the squares in the visited
+        bitmask. If through is given, only find paths that go through that
+        square."""
+        c = self.board[i]
+        node = node.child(c)
+        if node is not None and c == 'Q':
+            node = node.child('U')
+        if node is None:
             return
-        wordpos, is_word = self.wordlist.lookup(prefix, lo, hi)
-        if wordpos is not None:
-            if is_word:
-                self.found[prefix] = True
-            visited.append(i)
-            c = self.board[i]
-            if c == 'Q':
-                c = 'QU'
-            prefix += c
-            for j in self.neighbors[i]:
-                self.find(wordpos, hi, j, visited, prefix)
-            visited.pop()
+        visited |= 1 << i
+        if through is not None and not visited >> through & 1:
+            if node.height < self.distances[i][through]:
+                return
+        elif node.word is not None:
+            self.found[node.word] = self.found.get(node.word, 0) + 1
+            self.paths.append((visited, node.word))
+        for j in self.neighbors[i]:
+            if not visited >> j & 1:
+                self.find(node, j, visited, through)
 
     def words(self):
         "The words found."
@@ -1065,22 +2505,24 @@ class BoggleFinder:
 # _____________________________________________________________________________
 
 
-def boggle_hill_climbing(board=None, ntimes=100, verbose=True):
+def boggle_hill_climbing(board=None, ntimes=100, verbose=True, finder=None):
     """Solve inverse Boggle by hill-climbing: find a high-scoring board by
-    starting with a random one and changing it."""
-    finder = BoggleFinder()
+    starting with a random one and changing it. Each change is re-scored
+    incrementally, with BoggleFinder.set_cell."""
+    if finder is None:
+        finder = BoggleFinder()
     if board is None:
         board = random_boggle()
     best = len(finder.set_board(board))
     for _ in range(ntimes):
         i, oldc = mutate_boggle(board)
-        new = len(finder.set_board(board))
+        new = len(finder.set_cell(i, board[i]))
         if new > best:
             best = new
             if verbose:
                 print(best, _, board)
         else:
-            board[i] = oldc  # Change back
+            finder.set_cell(i, oldc)  # Change back
     if verbose:
         print_boggle(board)
     return board, best
@@ -1100,34 +2542,88 @@ def mutate_boggle(board):
 
 class InstrumentedProblem(Problem):
 
-    """Delegates to a problem, and keeps statistics."""
+    """Delegates to a problem, and keeps statistics: the number of nodes
+    expanded (succs), generated (states) and goal-tested, the number of h
+    calls, the time spent in actions, result, goal_test and h, and the peak
+    frontier and explored sizes, which the searchers report through
+    observe. Use instrumented_search to also time the whole search, and
+    record to get the statistics as a dict."""
 
     def __init__(self, problem):
         self.problem = problem
-        self.succs = self.goal_tests = self.states = 0
+        self.succs = self.goal_tests = self.states = self.h_calls = 0
+        self.value_calls = 0
+        self.max_frontier = self.max_explored = 0
+        self.time = defaultdict(float)
+        self.wall_time = 0
+        self.inverse_problem = None
         self.found = None
 
     def actions(self, state):
         self.succs += 1
-        return self.problem.actions(state)
+        start = time.perf_counter()
+        actions = self.problem.actions(state)
+        self.time['actions'] += time.perf_counter() - start
+        return actions
 
     def result(self, state, action):
         self.states += 1
-        return self.problem.result(state, action)
+        start = time.perf_counter()
+        result = self.problem.result(state, action)
+        self.time['result'] += time.perf_counter() - start
+        return result
 
     def goal_test(self, state):
         self.goal_tests += 1
+        start = time.perf_counter()
         result = self.problem.goal_test(state)
+        self.time['goal_test'] += time.perf_counter() - start
         if result:
             self.found = state
         return result
 
+    def h(self, node):
+        self.h_calls += 1
+        start = time.perf_counter()
+        h = self.problem.h(node)
+        self.time['h'] += time.perf_counter() - start
+        return h
+
     def path_cost(self, c, state1, action, state2):
         return self.problem.path_cost(c, state1, action, state2)
 
     def value(self, state):
+        self.value_calls += 1
         return self.problem.value(state)
 
+    def inverse(self):
+        "Instrument the backward half of a bidirectional search as well."
+        self.inverse_problem = InstrumentedProblem(self.problem.inverse())
+        return self.inverse_problem
+
+    def observe(self, frontier_size, explored_size=0):
+        "Called by the searchers with their current frontier and explored sizes."
+        if frontier_size > self.max_frontier:
+            self.max_frontier = frontier_size
+        if explored_size > self.max_explored:
+            self.max_explored = explored_size
+
+    def record(self):
+        "Return the statistics as a flat dict, e.g. for save_records."
+        parts = [self] + ([self.inverse_problem] if self.inverse_problem else [])
+        record = dict(
+            expanded=sum(p.succs for p in parts),
+            generated=sum(p.states for p in parts),
+            goal_tests=self.goal_tests,
+            h_calls=sum(p.h_calls for p in parts),
+            max_frontier=self.max_frontier,
+            max_explored=self.max_explored,
+            wall_time=self.wall_time,
+            found=None if self.found is None else str(self.found))
+        for key in ('actions', 'result', 'goal_test', 'h'):
+            record[key + '_time'] = sum(p.time[key] for p in parts)
+        return record
+
     def __getattr__(self, attr):
         return getattr(self.problem, attr)
 
@@ -1136,6 +2632,52 @@ class InstrumentedProblem(Problem):
                                      self.states, str(self.found)[:4])
 
 
+def observer(problem):
+    """Return the problem's observe method if it keeps search statistics (as
+    InstrumentedProblem does), else a function that does nothing."""
+    return getattr(problem, 'observe', None) or (lambda frontier_size, explored_size=0: None)
+
+
+def instrumented_search(searcher, problem):
+    """Run searcher on an InstrumentedProblem wrapping problem, and return
+    the InstrumentedProblem, with wall_time and the searcher's result set."""
+    p = InstrumentedProblem(problem)
+    start = time.perf_counter()
+    p.solution_node = searcher(p)
+    p.wall_time = time.perf_counter() - start
+    return p
+
+
+def search_records(searchers, problems):
+    """Run every searcher on every problem and return a list of dicts, one
+    per run, with the searcher and problem names, the solution cost and the
+    statistics of InstrumentedProblem.record."""
+    records = []
+    for problem in problems:
+        for searcher in searchers:
+            p = instrumented_search(searcher, problem)
+            node = p.solution_node
+            record = dict(searcher=name(searcher),
+                          problem='%s(%s, %s)' % (name(problem), problem.initial,
+                                                  problem.goal),
+                          cost=node.path_cost if isinstance(node, Node) else None)
+            record.update(p.record())
+            records.append(record)
+    return records
+
+
+def save_records(records, file, format='json'):
+    """Write search records to an open text file, as JSON lines (one record
+    per line) or, with format='csv', as CSV with a header row."""
+    if format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+    else:
+        for record in records:
+            file.write(json.dumps(record) + '\n')
+
+
 def compare_searchers(problems, header,
                       searchers=[breadth_first_tree_search,
                                  breadth_first_search,
@@ -1143,11 +2685,8 @@ def compare_searchers(problems, header,
                                  iterative_deepening_search,
                                  depth_limited_search,
                                  recursive_best_first_search]):
-    def do(searcher, problem):
-        p = InstrumentedProblem(problem)
-        searcher(p)
-        return p
-    table = [[name(s)] + [do(s, p) for p in problems] for s in searchers]
+    table = [[name(s)] + [instrumented_search(s, p) for p in problems]
+             for s in searchers]
     print_table(table, header)
 
 
@@ -1158,3 +2697,127 @@ def compare_graph_searchers():
                                 GraphProblem('Q', 'WA', australia_map)],
                       header=['Searcher', 'romania_map(Arad, Bucharest)',
                               'romania_map(Oradea, Neamt)', 'australia_map'])
+
+
+def benchmark_problems(size=300, seed=0):
+    """Two large problems, the same for the same size and seed, for timing
+    searchers whose frontier is a PriorityQueue: a corner-to-corner path on
+    a size x size grid with a fifth of its cells blocked, and a route
+    across a road map of (size // 2) ** 2 towns on a jittered lattice, each
+    with roads to its lattice neighbors and some diagonals, as a
+    CompactGraph."""
+    rng = random.Random(seed)
+    grid = [[rng.random() < 0.2 for x in range(size)] for y in range(size)]
+    grid[0][0] = grid[-1][-1] = False
+    n = size // 2
+    locations = {i * n + j: (10 * i + rng.randrange(5), 10 * j + rng.randrange(5))
+                 for i in range(n) for j in range(n)}
+    roads = []
+    for i in range(n):
+        for j in range(n):
+            for (di, dj) in [(1, 0), (0, 1), (1, 1), (1, -1)]:
+                if (0 <= i + di < n and 0 <= j + dj < n and
+                        (di == 0 or dj == 0 or rng.random() < 0.3)):
+                    a, b = i * n + j, (i + di) * n + j + dj
+                    d = distance(locations[a], locations[b]) * rng.uniform(1.1, 1.5)
+                    roads.append((a, b, int(d)))
+    road_map = CompactGraph(roads, directed=False)
+    road_map.locations = locations
+    return [GridProblem((0, 0), (size - 1, size - 1), grid),
+            GraphProblem(0, n * n - 1, road_map)]
+
+
+def benchmark_searchers(problems=None, searchers=[uniform_cost_search, astar_search],
+                        repeat=3):
+    """Run every searcher on every problem (by default benchmark_problems())
+    repeat times, print a table of the best wall times in seconds, and
+    return one record per run (searcher, problem, cost and wall_time), as
+    for save_records. Nothing is instrumented, so the times are those of
+    the searches alone."""
+    problems = problems or benchmark_problems()
+    records, table = [], []
+    for searcher in searchers:
+        row = [name(searcher)]
+        for problem in problems:
+            best = infinity
+            for _ in range(repeat):
+                start = time.perf_counter()
+                node = searcher(problem)
+                wall_time = time.perf_counter() - start
+                best = min(best, wall_time)
+                records.append(dict(
+                    searcher=name(searcher),
+                    problem='%s(%s, %s)' % (name(problem), problem.initial, problem.goal),
+                    cost=node.path_cost if isinstance(node, Node) else None,
+                    wall_time=wall_time))
+            row.append(best)
+        table.append(row)
+    print_table(table, ['Searcher'] + [name(problem) for problem in problems],
+                numfmt='{:.3f}')
+    return records
+
+# ______________________________________________________________________________
+# Running searchers in parallel processes
+
+
+def run_searcher(searcher, problem, seed=None):
+    """Run searcher on problem, after seeding the random number generator
+    if a seed is given. This is what the worker processes call."""
+    if seed is not None:
+        random.seed(seed)
+    return searcher(problem)
+
+
+def portfolio_search(problem, searchers, timeout=None, best=False,
+                     seed=None, processes=None):
+    """Run several searchers on the same problem, each in its own process,
+    and return the first solution Node found (or None). With best=True, wait
+    for all the searchers (or until timeout seconds have passed) and return
+    the solution with the lowest path cost. Use functools.partial to give a
+    searcher different arguments, e.g. partial(astar_search, h=my_h). With
+    a seed, the i-th searcher is run after random.seed(seed + i). Searchers
+    that are still running when we return are terminated. If no searcher
+    finds a solution and one of them raised, its exception is re-raised.
+    Searchers and problem must be picklable, so lambdas won't do."""
+    results = queue.Queue()
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    solution = error = None
+    with multiprocessing.Pool(processes or len(searchers)) as pool:
+        for (i, searcher) in enumerate(searchers):
+            pool.apply_async(run_searcher,
+                             (searcher, problem,
+                              None if seed is None else seed + i),
+                             callback=results.put, error_callback=results.put)
+        for _ in searchers:
+            remaining = (None if deadline is None
+                         else max(0, deadline - time.perf_counter()))
+            try:
+                node = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if isinstance(node, BaseException):
+                error = error or node
+            elif isinstance(node, Node):
+                if not best:
+                    return node
+                if solution is None or node.path_cost < solution.path_cost:
+                    solution = node
+    if solution is None and error is not None:
+        raise error
+    return solution
+
+
+def batch_search(searcher, problems, processes=None):
+    """Solve many independent problems with searcher across a pool of
+    processes. Yields (i, result) pairs, where result is what the searcher
+    returned for problems[i], in the order they finish."""
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap_unordered(
+            functools.partial(run_indexed_searcher, searcher),
+            enumerate(problems))
+
+
+def run_indexed_searcher(searcher, indexed_problem):
+    "Run searcher on an (i, problem) pair, returning (i, result)."
+    i, problem = indexed_problem
+    return i, searcher(problem)
@@ -3,6 +3,9 @@
 # You can run this test suite by doing: py.test tests/games.py
 # Of course you need to have py.test installed to do this.
 
+import io
+import random
+
 import pytest
 
 from games import *  # noqa
@@ -59,6 +62,184 @@ def test_alphabeta_full_search():
     assert alphabeta_full_search(state, ttt) == (1, 3)
 
 
+def test_alphabeta_search_batch_eval():
+    game = KInARowConnectFour()
+    calls = []
+
+    def eval_fn(state):
+        return game.evaluate(state, 'O')
+
+    def batch_eval_fn(states):
+        calls.append(len(states))
+        return [eval_fn(state) for state in states]
+
+    state = game.initial
+    for move in [(4, 1), (4, 2), (3, 1)]:
+        state = game.result(state, move)
+    for d in (1, 2, 3):
+        del calls[:]
+        move = alphabeta_search(state, game, d=d, eval_fn=eval_fn)
+        assert alphabeta_search(state, game, d=d, eval_fn=eval_fn,
+                                batch_eval_fn=batch_eval_fn) == move
+        assert calls and all(n <= 7 for n in calls)
+
+
+def test_AlphaBetaEngine():
+    engine = AlphaBetaEngine(f52)
+    assert [engine.search(s) for s in 'ABCD'] == ['a1', 'b1', 'c1', 'd3']
+
+    engine = AlphaBetaEngine(ttt)
+    state = gen_state(to_move='X', x_positions=[(1, 1), (3, 3)],
+                      o_positions=[(1, 2), (3, 2)])
+    assert engine.search(state) == (2, 2) and engine.value == 1
+
+    engine = AlphaBetaEngine(ttt)
+    state = gen_state(to_move='O', x_positions=[(1, 1)], o_positions=[])
+    assert engine.search(state) == (2, 2) and engine.value == 0
+    assert 0 < engine.nodes < 3000 and engine.depth == 8
+
+    def play(*moves):
+        state = ttt.initial
+        for move in moves:
+            state = ttt.result(state, move)
+        return state
+    assert ttt.state_key(play((1, 1), (2, 2), (3, 3))) == ttt.state_key(play((3, 3), (2, 2), (1, 1)))
+    assert ttt.state_key(play((1, 1), (2, 2))) != ttt.state_key(play((2, 2), (1, 1)))
+    c4 = ConnectFour()
+    engine = AlphaBetaEngine(c4, depth=20, time_limit=0.2)
+    assert engine.search(c4.initial) in c4.actions(c4.initial)
+    assert engine.depth >= 1 and engine.elapsed < 1
+
+
+def test_bitboard_games():
+    for (game, bitboard) in [(ttt, BitboardTicTacToe()), (TicTacToe(5, 4, 3), BitboardTicTacToe(5, 4, 3)),
+                             (ConnectFour(), BitboardConnectFour())]:
+        random.seed(1)
+        for _ in range(50):
+            state, bitstate = game.initial, bitboard.initial
+            while not game.terminal_test(state):
+                assert sorted(game.actions(state)) == sorted(bitboard.actions(bitstate))
+                assert not bitboard.terminal_test(bitstate)
+                move = random.choice(game.actions(state))
+                state, bitstate = game.result(state, move), bitboard.result(bitstate, move)
+            assert bitboard.terminal_test(bitstate) and state.utility == bitstate.utility
+
+    bttt = BitboardTicTacToe()
+    state = bttt.initial
+    for move in [(1, 1), (1, 2), (3, 3), (3, 2)]:
+        state = bttt.result(state, move)
+    assert alphabeta_full_search(state, bttt) == (2, 2)
+    assert bttt.result(state, (1, 1)) == state and hash(state) == hash(tuple(state))
+    assert play_game(bttt, alphabeta_player, random_player) >= 0
+    assert play_game(bttt, AlphaBetaEngine(bttt), AlphaBetaEngine(bttt)) == 0
+    c4 = BitboardConnectFour()
+    assert c4.actions(c4.initial) == [(x, 1) for x in range(1, 8)]
+    assert c4.result(c4.initial, (1, 2)) == c4.initial
+    # The packed bitboard keys must spread over the table as well as Zobrist keys do
+    engines = [AlphaBetaEngine(game, depth=8) for game in (c4, ConnectFour())]
+    for engine in engines:
+        engine.search(engine.game.initial)
+    assert engines[0].nodes < 1.1 * engines[1].nodes
+
+
+def test_MCTSPlayer():
+    random.seed(2)
+    player = MCTSPlayer(simulations=500)
+    state = gen_state(to_move='X', x_positions=[(1, 1), (3, 3)],
+                      o_positions=[(1, 2), (3, 2)])
+    assert player(ttt, state) == (2, 2)
+    assert player.playouts == 500 and player.playouts_per_second > 0
+    state = gen_state(to_move='O', x_positions=[(1, 1), (1, 2)],
+                      o_positions=[(2, 2)])
+    assert player(ttt, state) == (1, 3)
+    # The tree below the chosen move is kept for the next call
+    next_state = ttt.result(state, (1, 3))
+    assert player.root.state == next_state and player.root.visits > 0
+    assert player.reuse(ttt, next_state) is player.root
+
+    assert play_game(ttt, MCTSPlayer(simulations=300), random_player) >= 0
+    # Out of time before any playout finishes: still a legal move
+    player = MCTSPlayer(time_limit=1e-9)
+    assert player(ttt, ttt.initial) in ttt.actions(ttt.initial) and player.playouts == 1
+    with MCTSPlayer(simulations=200, processes=2, seed=1) as player:
+        c4 = BitboardConnectFour()
+        assert player(c4, c4.initial) in c4.actions(c4.initial)
+        assert player.playouts == 200
+
+
+def test_SolvedGame():
+    solved = SolvedGame(ttt)
+    assert len(solved) == 765  # The positions of TicTacToe, up to symmetry
+    assert solved.value(ttt.initial) == 0
+    state = gen_state(to_move='O', x_positions=[(1, 1), (3, 1), (3, 3)],
+                      o_positions=[(1, 2), (3, 2)])
+    assert solved.value(state) == 1 and solved.best_move(state) == (2, 2)
+    assert ttt.canonical_key(ttt.result(ttt.initial, (1, 1))) == \
+        ttt.canonical_key(ttt.result(ttt.initial, (3, 3)))
+    assert play_game(ttt, solved, random_player) >= 0
+    assert play_game(ttt, solved, solved) == 0
+
+    file = io.BytesIO()
+    solved.save(file)
+    file.seek(0)
+    assert load_solved_game(file, ttt).values == solved.values
+
+    c4 = BitboardConnectFour(4, 3, 3)
+    assert len(board_symmetries(4, 3, c4.gravity)) == 2
+    dict_c4 = ConnectFour(4, 3, 3)
+    assert SolvedGame(c4).value(c4.initial) == SolvedGame(dict_c4).value(dict_c4.initial)
+
+
+def test_tournament():
+    players = dict(random=random_player, alphabeta=alphabeta_player)
+    file = io.StringIO()
+    records = tournament(ttt, players, games=6, seed=3, file=file)
+    assert len(records) == 6 and len(file.getvalue().splitlines()) == 6
+    assert [r['first'] for r in records] == ['random', 'alphabeta'] * 3
+    assert all(len(r['move_times']) == r['moves'] for r in records)
+    parallel = tournament(ttt, players, games=6, seed=3, processes=2)
+    assert [r['utility'] for r in parallel] == [r['utility'] for r in records]
+
+    stats = tournament_stats(records)
+    assert stats['alphabeta']['losses'] == 0 and stats['random']['wins'] == 0
+    assert stats['alphabeta']['elo'] > 0 > stats['random']['elo']
+    low, high = stats['random']['interval']
+    assert 0 <= low <= stats['random']['score'] <= high <= 1
+
+
+def test_KInARow():
+    for (game, bitboard) in [(KInARow(3, 3, 3), BitboardTicTacToe()),
+                             (KInARow(), BitboardTicTacToe(15, 15, 5)),
+                             (KInARowConnectFour(), BitboardConnectFour())]:
+        random.seed(0)
+        for _ in range(10):
+            state, bitstate = game.initial, bitboard.initial
+            while not bitboard.terminal_test(bitstate):
+                assert game.actions(state) == bitboard.actions(bitstate)
+                move = random.choice(bitboard.actions(bitstate))
+                state, bitstate = game.result(state, move), bitboard.result(bitstate, move)
+                assert state.utility == bitstate.utility
+                assert state.score == game.window_score(state.x, state.o)
+            assert game.terminal_test(state)
+
+    gomoku = KInARow(near=1)
+    assert gomoku.actions(gomoku.initial) == [(8, 8)]
+    state = gomoku.result(gomoku.initial, (8, 8))
+    assert len(gomoku.actions(state)) == 8
+    assert 0 < gomoku.evaluate(state, 'X') < 1 and gomoku.evaluate(state, 'O') < 0
+    for move in [(1, 1), (9, 8), (1, 2), (10, 8), (1, 3), (11, 8), (1, 4)]:
+        state = gomoku.result(state, move)
+    # X can complete its open four before O completes its four
+    engine = AlphaBetaEngine(gomoku, depth=2, eval_fn=gomoku.evaluate)
+    assert engine.search(state) in [(7, 8), (12, 8)] and engine.value == 1
+
+    # The ring around a stone on the edge does not wrap into the next column
+    gomoku = KInARow(near=2)
+    state = gomoku.result(gomoku.initial, (3, 15))
+    assert sorted(gomoku.actions(state)) == sorted(
+        (x, y) for x in range(1, 6) for y in range(13, 16) if (x, y) != (3, 15))
+
+
 def test_random_tests():
     assert play_game(Fig52Game(), alphabeta_player, alphabeta_player) == 3
 
@@ -67,6 +248,7 @@ def test_random_tests():
 
     # The player 'X' (one who plays first) in TicTacToe never loses:
     assert play_game(ttt, alphabeta_player, random_player) >= 0
+    assert play_game(ttt, AlphaBetaEngine(ttt), random_player) >= 0
 
 
 if __name__ == '__main__':
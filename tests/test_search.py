@@ -1,5 +1,11 @@
+import io
+import pickle
+import random
+import time
+
 import pytest
 from search import *  # noqa
+from utils import isclose
 
 
 romania_problem = GraphProblem('Arad', 'Bucharest', romania_map)
@@ -7,6 +13,17 @@ vacumm_world = GraphProblemStochastic('State_1', ['State_7', 'State_8'], vacumm_
 LRTA_problem = OnlineSearchProblem('State_3', 'State_5', one_dim_state_space)
 
 
+def test_Node():
+    root = Node('Arad')
+    child = root.child_node(romania_problem, 'Sibiu')
+    grandchild = child.child_node(romania_problem, 'Fagaras')
+    assert grandchild.solution() == ['Sibiu', 'Fagaras'] and root.solution() == []
+    assert grandchild.path() == [root, child, grandchild]
+    assert grandchild.depth == 2 and grandchild.path_cost == 239
+    assert not hasattr(root, '__dict__')
+    root.f = 0
+
+
 def test_breadth_first_tree_search():
     assert breadth_first_tree_search(romania_problem).solution() == ['Sibiu', 'Fagaras', 'Bucharest']
 
@@ -15,6 +32,11 @@ def test_breadth_first_search():
     assert breadth_first_search(romania_problem).solution() == ['Sibiu', 'Fagaras', 'Bucharest']
 
 
+def test_breadth_first_reached_search():
+    assert breadth_first_reached_search(romania_problem).solution() == ['Sibiu', 'Fagaras', 'Bucharest']
+    assert breadth_first_reached_search(GraphProblem('Arad', 'Nowhere', romania_map)) is None
+
+
 def test_uniform_cost_search():
     assert uniform_cost_search(romania_problem).solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
 
@@ -36,14 +58,260 @@ def test_depth_limited_search():
     assert solution_50[-1] == 'Bucharest'
 
 
+def test_deep_depth_limited_search():
+    class Line(Problem):
+        def actions(self, state):
+            return [1]
+
+        def result(self, state, action):
+            return state + action
+
+    assert depth_limited_search(Line(0, 5000), 10000).depth == 5000
+    assert depth_limited_search(Line(0, 5000), 4999) == 'cutoff'
+    assert depth_limited_search(GraphProblem('Arad', 'Nowhere', romania_map), 30, avoid_cycles=True) is None
+    assert iterative_deepening_search(romania_problem, avoid_cycles=True).solution() == ['Sibiu', 'Fagaras', 'Bucharest']
+
+
 def test_astar_search():
     assert astar_search(romania_problem).solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
 
 
+def test_iterative_deepening_astar_search():
+    assert iterative_deepening_astar_search(romania_problem).solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
+    assert iterative_deepening_astar_search(romania_problem, avoid_cycles=False).path_cost == 418
+    assert iterative_deepening_astar_search(GraphProblem('Arad', 'Nowhere', romania_map), lambda n: 0) is None
+
+
+def test_beam_search():
+    assert beam_search(romania_problem, width=2).solution() == ['Sibiu', 'Fagaras', 'Bucharest']
+    assert beam_search(GraphProblem('Arad', 'Nowhere', romania_map), 2, lambda n: n.path_cost) is None
+
+
+def test_anytime_astar_search():
+    costs = [node.path_cost for node in anytime_repairing_astar(romania_problem, epsilon=5, step=1)]
+    assert costs[0] == 450 and costs[-1] == 418
+    assert all(a >= b for (a, b) in zip(costs, costs[1:]))
+    assert anytime_astar_search(romania_problem).solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
+    assert anytime_astar_search(romania_problem, time_limit=0) is None
+
+
+def test_bidirectional_uniform_cost_search():
+    assert bidirectional_uniform_cost_search(romania_problem).solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
+    one_way = Graph(dict(A=dict(B=1, C=5), B=dict(C=1)))
+    assert bidirectional_uniform_cost_search(GraphProblem('A', 'C', one_way)).solution() == ['B', 'C']
+    assert bidirectional_uniform_cost_search(GraphProblem('C', 'A', one_way)) is None
+
+
+def test_bidirectional_astar_search():
+    node = bidirectional_astar_search(romania_problem)
+    assert node.solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
+    assert node.path_cost == 418
+
+
+def test_Landmarks():
+    landmarks = Landmarks(romania_map, landmarks=['Eforie', 'Timisoara', 'Neamt'])
+    assert graph_distances(romania_map, 'Arad')['Bucharest'] == 418
+    assert 0 < landmarks.estimate('Arad', 'Bucharest') <= 418
+    assert landmarks.estimate('Arad', 'Arad') == 0
+    node = astar_search(romania_problem, landmarks.heuristic('Bucharest'))
+    assert node.solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
+
+    file = io.BytesIO()
+    landmarks.save(file)
+    file.seek(0)
+    assert load_landmarks(file).estimate('Arad', 'Bucharest') == landmarks.estimate('Arad', 'Bucharest')
+
+    one_way = Graph(dict(A=dict(B=1, C=5), B=dict(C=1)))
+    landmarks = Landmarks(one_way, landmarks=['A', 'C'])
+    assert landmarks.estimate('A', 'C') == 2 and landmarks.estimate('C', 'A') == 0
+    assert len(Landmarks(romania_map, k=4).landmarks) == 4
+
+
 def test_recursive_best_first_search():
     assert recursive_best_first_search(romania_problem).solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
 
 
+def test_CompactGraph():
+    g = compact_graph(romania_map)
+    assert sorted(g.nodes()) == sorted(romania_map.nodes())
+    assert g.get('Arad') == romania_map.get('Arad')
+    assert g.get('Arad', 'Sibiu') == 140 and g.get('Arad', 'Bucharest') is None
+    assert g.get('Nowhere') == {}
+    problem = GraphProblem('Arad', 'Bucharest', g)
+    assert astar_search(problem).solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
+    assert uniform_cost_search(problem).path_cost == 418
+
+    g = load_compact_graph(['# from to distance', '1 2 5', '2 3', '', '1 3 1.5'])
+    assert g.nodes() == [1, 2, 3]
+    assert g.get(1) == {2: 5, 3: 1.5} and g.get(2, 3) == 1 and g.get(2, 1) is None
+    g.connect(3, 4, 2)
+    assert g.get(3) == {4: 2} and g.get(3, 4) == 2
+    assert uniform_cost_search(GraphProblem(1, 4, g)).solution() == [3, 4]
+
+
+def test_search_records():
+    p = instrumented_search(astar_search, romania_problem)
+    assert p.solution_node.path_cost == 418
+    assert p.succs == 5 and p.h_calls > 0 and p.max_frontier > 0 and p.wall_time > 0
+    for searcher in [anytime_astar_search, recursive_best_first_search,
+                     memory_bounded_astar_search]:
+        assert instrumented_search(searcher, romania_problem).max_frontier > 0
+
+    records = search_records([breadth_first_search, bidirectional_uniform_cost_search],
+                             [romania_problem])
+    assert [r['searcher'] for r in records] == ['breadth_first_search', 'bidirectional_uniform_cost_search']
+    assert records[0]['cost'] == 450 and records[0]['found'] == 'Bucharest'
+    assert records[1]['cost'] == 418 and records[1]['expanded'] > 0
+
+    file = io.StringIO()
+    save_records(records, file)
+    assert len(file.getvalue().splitlines()) == 2
+    file = io.StringIO()
+    save_records(records, file, format='csv')
+    assert file.getvalue().startswith('searcher,problem,cost,expanded,')
+
+
+def test_benchmark_searchers():
+    problems = benchmark_problems(size=20)
+    assert len(problems[1].graph.nodes()) == 100
+    records = benchmark_searchers(problems, repeat=2)
+    assert len(records) == 8 and all(r['wall_time'] > 0 for r in records)
+    # uniform_cost_search and astar_search find equally short paths
+    assert [r['cost'] for r in records[:4]] == [r['cost'] for r in records[4:]]
+
+
+def sleeping_search(problem):
+    time.sleep(10)
+    return Node(problem.initial)
+
+
+def broken_search(problem):
+    raise RuntimeError('broken')
+
+
+def test_portfolio_search():
+    node = portfolio_search(romania_problem, [sleeping_search, astar_search])
+    assert node.solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
+    node = portfolio_search(romania_problem, [breadth_first_search, uniform_cost_search], best=True)
+    assert node.path_cost == 418
+    assert portfolio_search(romania_problem, [sleeping_search], timeout=0.1) is None
+    for best in (False, True):
+        with pytest.raises(RuntimeError):
+            portfolio_search(romania_problem, [broken_search], best=best)
+        node = portfolio_search(romania_problem, [broken_search, astar_search], best=best)
+        assert node.path_cost == 418
+
+
+def test_batch_search():
+    problems = [GraphProblem('Arad', goal, romania_map) for goal in ['Bucharest', 'Zerind', 'Arad']]
+    solutions = dict((i, node.solution()) for (i, node) in batch_search(astar_search, problems, 2))
+    assert solutions == {0: ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest'], 1: ['Zerind'], 2: []}
+
+
+def test_memory_bounded_astar_search():
+    stats = {}
+    node = memory_bounded_astar_search(romania_problem, max_nodes=1000, stats=stats)
+    assert node.solution() == ['Sibiu', 'Rimnicu', 'Pitesti', 'Bucharest']
+    assert stats == dict(expanded=5, forgotten=0, regenerated=0)
+
+    problem = GraphProblem('Oradea', 'Neamt', romania_map)
+    stats = {}
+    node = memory_bounded_astar_search(problem, max_nodes=20, stats=stats)
+    assert node.path_cost == astar_search(problem).path_cost
+    assert stats['forgotten'] > 0 and stats['regenerated'] > 0
+
+    # An unsolvable problem on a graph with cycles fails cleanly
+    graph = UndirectedGraph(dict(A=dict(B=1, C=1, D=1), B=dict(C=1, D=1), C=dict(D=1)))
+    graph.locations = dict(A=(0, 0), B=(1, 0), C=(0, 1), D=(1, 1), E=(5, 5))
+    for max_nodes in (5, 1000):
+        assert memory_bounded_astar_search(GraphProblem('A', 'E', graph), max_nodes=max_nodes) is None
+
+
+def test_jump_point_search():
+    grid = [[0, 0, 0, 0, 0, 0],
+            [0, 1, 1, 1, 1, 0],
+            [0, 0, 0, 0, 1, 0],
+            [1, 1, 1, 0, 1, 0],
+            [0, 0, 0, 0, 0, 0]]
+    for diagonal in (True, False):
+        problem = GridProblem((0, 4), (5, 0), grid, diagonal)
+        node = jump_point_search(problem)
+        assert node.state == (5, 0)
+        assert isclose(node.path_cost, astar_search(problem).path_cost)
+        assert len(node.solution()) == node.depth
+
+    grid = [[0] * 60 for _ in range(60)]
+    for y in range(10, 50):
+        grid[y][30] = 1
+    problem = InstrumentedProblem(GridProblem((5, 30), (55, 30), grid))
+    node = jump_point_search(problem)
+    assert isclose(node.path_cost, astar_search(GridProblem((5, 30), (55, 30), grid)).path_cost)
+    assert problem.succs < 10
+    assert jump_point_search(GridProblem((0, 0), (2, 0), [[0, 1, 0]])) is None
+
+
+class BitString(GAState):
+    def mutate(self):
+        i = random.randrange(len(self.genes))
+        self.genes[i] = 1 - self.genes[i]
+
+
+def count_ones(individual):
+    return sum(individual.genes) + 1
+
+
+def test_genetic_algorithm():
+    random.seed(42)
+    population = [BitString([random.randint(0, 1) for _ in range(20)]) for _ in range(30)]
+    best = genetic_algorithm(population, count_ones, ngen=100, pmut=0.5, elitism=2)
+    assert count_ones(best) >= 19
+    best = genetic_algorithm(population, count_ones, ngen=1000, pmut=0.5, elitism=2,
+                             selection=tournament_selection(3), patience=30)
+    assert count_ones(best) == 21
+    with ParallelFitness(count_ones, 2) as evaluate:
+        best = genetic_algorithm(population, count_ones, ngen=30, pmut=0.5,
+                                 selection=tournament_selection(3), evaluate=evaluate)
+    assert count_ones(best) >= 19
+
+
+class Bumps(Problem):
+    """Maximize a bumpy function of the integers 0..99 by steps of +-1 or
+    +-3; there are many local maxima and the global one is at 79."""
+
+    def actions(self, state):
+        return [d for d in (-3, -1, 1, 3) if 0 <= state + d < 100]
+
+    def result(self, state, action):
+        return state + action
+
+    def value(self, state):
+        return (state % 10) * 3 - abs(state - 77)
+
+    def random_state(self):
+        return random.randrange(100)
+
+
+def test_local_search():
+    problem = Bumps(5)
+    assert hill_climbing(problem) == 9
+    assert first_choice_hill_climbing(problem) == 9
+    assert hill_climbing(Bumps(85)) == 89
+    assert tabu_search(Bumps(85), tenure=20, max_steps=200) == 79
+    node = simulated_annealing(problem, linear_schedule(k=10, limit=500))
+    assert 0 <= node.state < 100
+    best, stats = random_restart_search(first_choice_hill_climbing, problem,
+                                        restarts=20, seed=1)
+    assert len(stats) == 20 and [s['restart'] for s in stats] == list(range(20))
+    assert problem.value(best) == max(s['value'] for s in stats)
+    assert all(s['evaluations'] > 0 for s in stats)
+    parallel, parallel_stats = random_restart_search(first_choice_hill_climbing, problem,
+                                                     restarts=20, seed=1, processes=2)
+    assert parallel == best
+    assert [s['value'] for s in parallel_stats] == [s['value'] for s in stats]
+    for searcher in [hill_climbing, first_choice_hill_climbing, simulated_annealing, tabu_search]:
+        assert instrumented_search(searcher, problem).max_frontier > 0
+
+
 def test_BoggleFinder():
     board = list('SARTELNID')
     """
@@ -56,6 +324,49 @@ def test_BoggleFinder():
     assert len(f) == 206
 
 
+def test_boggle_trie():
+    wordlist = Wordlist(io.StringIO('sat seat east eats tea teas set quit quits at'))
+    trie = wordlist.trie()
+    assert 'SEAT' in trie and 'SEA' not in trie and 'AT' not in trie
+    assert trie.lookup('QUI').height == 2 and trie.lookup('QX') is None
+    board = list('SEATXQTIS')
+    finder = BoggleFinder(board, wordlist)
+    assert sorted(finder.words()) == ['QUIT', 'QUITS', 'SET', 'TEA']
+    finder.set_cell(0, 'X')
+    assert sorted(finder.words()) == ['QUIT', 'TEA']
+    assert finder.found == BoggleFinder(list('XEATXQTIS'), wordlist).found
+    finder.set_cell(0, 'S')
+    assert len(finder) == 4 and finder.score() == 3
+    board, best = boggle_hill_climbing(board, ntimes=50, verbose=False,
+                                       finder=BoggleFinder(wordlist=wordlist))
+    assert best >= 4 and best == len(BoggleFinder(board, wordlist))
+
+
+def test_load_wordlist(tmp_path):
+    wordlist = Wordlist(io.StringIO('sat seat east eats tea teas set quit quits at'))
+    path = tmp_path / 'words.idx'
+    with open(path, 'wb') as file:
+        wordlist.save(file)
+    with open(path, 'rb') as file:
+        mapped = load_wordlist(file)
+    assert list(mapped.words) == wordlist.words and len(mapped) == 9
+    assert mapped.words[-1] == 'TEAS' and mapped.bounds == wordlist.bounds
+    assert 'EATS' in mapped and 'EAT' not in mapped
+    assert mapped.lookup('QUI') == (2, False)
+    assert pickle.loads(pickle.dumps(mapped)).words[2] == 'QUIT'
+    size = len(pickle.dumps(mapped))
+    finder = BoggleFinder(list('SEATXQTIS'), mapped)
+    assert sorted(finder.words()) == ['QUIT', 'QUITS', 'SET', 'TEA']
+    # The finder walks the trie stored in the file rather than building one
+    assert isinstance(finder.trie, MappedTrie) and not isinstance(mapped.trie(), Trie)
+    assert finder.trie.lookup('TE').height == wordlist.trie().lookup('TE').height == 2
+    assert 'SEAT' in finder.trie and finder.trie.lookup('TEA').word == 'TEA'
+    assert finder.trie.lookup('TEX') is None and 'SEA' not in finder.trie
+    # The Trie built for the finder is not pickled with the wordlist
+    assert len(pickle.dumps(mapped)) == size
+    assert pickle.loads(pickle.dumps(mapped)).trie().lookup('QUITS').word == 'QUITS'
+
+
 def test_and_or_graph_search():
     def run_plan(state, problem, plan):
         if problem.goal_test(state):
@@ -68,6 +379,26 @@ def test_and_or_graph_search():
     assert run_plan('State_1', vacumm_world, plan)
 
 
+def test_and_or_policy_search():
+    def reaches_goal(problem, policy, state, seen=()):
+        if problem.goal_test(state):
+            return True
+        if state in seen or state not in policy:
+            return False
+        return all(reaches_goal(problem, policy, s, seen + (state,))
+                   for s in problem.result(state, policy[state]))
+    policy = and_or_policy_search(vacumm_world)
+    assert policy == {'State_1': 'Suck', 'State_5': 'Right', 'State_6': 'Suck'}
+    assert reaches_goal(vacumm_world, policy, 'State_1')
+    assert and_or_policy_search(vacumm_world, h=lambda s: 0) == policy
+    assert and_or_policy_search(vacumm_world, cyclic=True) == {'State_1': 'Suck',
+                                                                 'State_5': 'Suck'}
+    slippery = GraphProblemStochastic('A', 'C', Graph(dict(
+        A=dict(Go=['A', 'B'], Jump=['D']), B=dict(Go=['B', 'C']), D=dict(Go=['D']))))
+    assert and_or_policy_search(slippery) is None
+    assert and_or_policy_search(slippery, cyclic=True) == {'A': 'Go', 'B': 'Go'}
+
+
 def test_LRTAStarAgent():
     my_agent = LRTAStarAgent(LRTA_problem)
     assert my_agent('State_3') == 'Right'
@@ -82,6 +413,33 @@ def test_LRTAStarAgent():
     my_agent = LRTAStarAgent(LRTA_problem)
     assert my_agent('State_5') is None
 
+
+def test_OnlineDFSAgent():
+    assert run_online_agent(OnlineDFSAgent(LRTA_problem), LRTA_problem) == [
+        'State_3', 'State_4', 'State_5']
+
+
+def test_batch_online_search():
+    problems = [LRTA_problem, OnlineSearchProblem('State_1', 'State_6', one_dim_state_space)]
+    results = batch_online_search(LRTAStarAgent, problems, trials=3)
+    assert [r['steps'] for r in results] == [[4, 2, 2], [9, 5, 5]]
+    assert all(all(r['solved']) for r in results)
+    H = results[0]['agent'].H
+    assert dict(H.items()) == {'State_3': 5, 'State_4': 4}
+    file = io.BytesIO()
+    H.save(file)
+    file.seek(0)
+    H = load_heuristic_table(file)
+    assert len(H) == 2 and H['State_3'] == 5 and H.get('State_1') is None
+    warm = batch_online_search(LRTAStarAgent, [LRTA_problem], processes=2, H=H)
+    assert warm[0]['steps'] == [2]
+    # A warm-start table is copied for each problem, serially as in a pool
+    problems += [OnlineSearchProblem('State_6', 'State_1', one_dim_state_space)]
+    serial = batch_online_search(LRTAStarAgent, problems, trials=2, H=H)
+    pooled = batch_online_search(LRTAStarAgent, problems, trials=2, processes=2, H=H)
+    assert [r['steps'] for r in serial] == [r['steps'] for r in pooled]
+    assert len(H) == 2
+
 # TODO: for .ipynb:
 """
 >>> compare_graph_searchers()
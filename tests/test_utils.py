@@ -141,6 +141,12 @@ def test_step():
     assert step(-1) == step(-0.5) == 0
 
 
+def test_map_jobs():
+    jobs = [(2, 3), (4, 0), (1, 1)]
+    assert list(map_jobs(pow, jobs)) == [8, 1, 1]
+    assert list(map_jobs(pow, jobs, processes=2)) == [8, 1, 1]
+
+
 def test_Expr():
     A, B, C = symbols('A, B, C')
     assert symbols('A, B, C') == (Symbol('A'), Symbol('B'), Symbol('C'))
@@ -176,5 +182,34 @@ def test_expr():
     assert (expr('GP(x, z) <== P(x, y) & P(y, z)')
             == Expr('<==', GP(x, z), P(x, y) & P(y, z)))
 
+
+def test_FIFOQueue():
+    q = FIFOQueue()
+    q.extend([1, 2, 1])
+    assert len(q) == 3 and 1 in q and 3 not in q
+    assert q.pop() == 1 and 1 in q
+    assert q.pop() == 2 and 2 not in q
+    assert q.pop() == 1 and 1 not in q
+    assert len(q) == 0
+
+
+def test_PriorityQueue():
+    q = PriorityQueue(min, len)
+    q.extend(['three', 'a', 'to', 'seven'])
+    assert len(q) == 4 and 'to' in q and 'six' not in q
+    assert q['to'] == 'to'
+    del q['to']
+    assert len(q) == 3 and 'to' not in q
+    assert [q.pop() for _ in range(3)] == ['a', 'seven', 'three']
+    assert len(q) == 0
+    with pytest.raises(IndexError):
+        q.pop()
+
+    q = PriorityQueue(max, abs)
+    q.extend([-3, 1, 4, 1])
+    assert len(q) == 4
+    assert [q.pop() for _ in range(4)] == [4, -3, 1, 1]
+
+
 if __name__ == '__main__':
     pytest.main()
@@ -4,10 +4,12 @@ import bisect
 import collections
 import collections.abc
 import functools
+import heapq
 import operator
 import os.path
 import random
 import math
+import multiprocessing
 
 # ______________________________________________________________________________
 # Functions on Sequences and Iterables
@@ -298,6 +300,24 @@ def name(obj):
             str(obj))
 
 
+def map_jobs(f, jobs, processes=1):
+    """Yield f(*job) for each job, in order. With processes other than 1 the
+    jobs run in a pool of that many worker processes (all CPUs if None), and
+    then f and the jobs must be picklable."""
+    if processes == 1:
+        for job in jobs:
+            yield f(*job)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            yield from pool.imap(call_job, [(f, job) for job in jobs])
+
+
+def call_job(f_job):
+    "f(*job), for the worker processes of map_jobs."
+    f, job = f_job
+    return f(*job)
+
+
 def isnumber(x):
     "Is x a number?"
     return hasattr(x, '__int__')
@@ -543,31 +563,33 @@ def Stack():
 
 class FIFOQueue(Queue):
 
-    """A First-In-First-Out Queue."""
+    """A First-In-First-Out Queue. Items are kept in a deque, and a count of
+    the items currently in the queue makes (item in q) constant time."""
 
     def __init__(self):
-        self.A = []
-        self.start = 0
+        self.A = collections.deque()
+        self.counts = collections.Counter()
 
     def append(self, item):
         self.A.append(item)
+        self.counts[item] += 1
 
     def __len__(self):
-        return len(self.A) - self.start
+        return len(self.A)
 
     def extend(self, items):
-        self.A.extend(items)
+        for item in items:
+            self.append(item)
 
     def pop(self):
-        e = self.A[self.start]
-        self.start += 1
-        if self.start > 5 and self.start > len(self.A) / 2:
-            self.A = self.A[self.start:]
-            self.start = 0
+        e = self.A.popleft()
+        self.counts[e] -= 1
+        if not self.counts[e]:
+            del self.counts[e]
         return e
 
     def __contains__(self, item):
-        return item in self.A[self.start:]
+        return item in self.counts
 
 
 class PriorityQueue(Queue):
@@ -575,37 +597,60 @@ class PriorityQueue(Queue):
     """A queue in which the minimum (or maximum) element (as determined by f and
     order) is returned first. If order is min, the item with minimum f(x) is
     returned first; if order is max, then it is the item with maximum f(x).
-    Also supports dict-like lookup."""
+    Also supports dict-like lookup.
+    The queue is a binary heap of [f(x), x, live] entries plus an index from
+    each item to its live entries, so append and pop are O(log n) and
+    membership, lookup and deletion are O(1). Deleted entries are only marked
+    dead and are discarded lazily when they reach the top of the heap."""
 
     def __init__(self, order=min, f=lambda x: x):
-        self.A = []
+        self.heap = []
+        self.index = {}
+        self.size = 0
         self.order = order
         self.f = f
 
     def append(self, item):
-        bisect.insort(self.A, (self.f(item), item))
+        value = self.f(item)
+        if self.order != min:
+            value = -value
+        entry = [value, item, True]
+        heapq.heappush(self.heap, entry)
+        self.index.setdefault(item, []).append(entry)
+        self.size += 1
 
     def __len__(self):
-        return len(self.A)
+        return self.size
 
     def pop(self):
-        if self.order == min:
-            return self.A.pop(0)[1]
-        else:
-            return self.A.pop()[1]
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            if entry[2]:
+                self._forget(entry)
+                return entry[1]
+        raise IndexError('pop from an empty priority queue')
+
+    def _forget(self, entry):
+        "Drop a popped entry from the index."
+        item = entry[1]
+        entries = self.index[item]
+        entries[:] = [e for e in entries if e is not entry]
+        if not entries:
+            del self.index[item]
+        self.size -= 1
 
     def __contains__(self, item):
-        return any(item == pair[1] for pair in self.A)
+        return item in self.index
 
     def __getitem__(self, key):
-        for _, item in self.A:
-            if item == key:
-                return item
+        entries = self.index.get(key)
+        if entries:
+            return entries[0][1]
 
     def __delitem__(self, key):
-        for i, (value, item) in enumerate(self.A):
-            if item == key:
-                self.A.pop(i)
+        for entry in self.index.pop(key, ()):
+            entry[2] = False
+            self.size -= 1
 
 # ______________________________________________________________________________
 # Useful Shorthands